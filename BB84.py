@@ -1,102 +1,129 @@
-import random
-import hashlib
+import sys
+
 import numpy as np
-from qiskit import QuantumCircuit
-from qiskit_aer import AerSimulator
+
+from analytic import BASIS_LABELS, random_bases, random_bits
+from audit import AuditedBackend
+from backends import get_backend
+from cascade import cascade
+from estimation import (estimate_from_sample, estimate_parameters, pauli_channel, per_basis_estimates,
+                        rate_estimate)
+from finite_key import EPS_COR, EPS_SEC, lookup_parameters, phase_error_bound, two_basis_key_length
+from keybuffer import KeyBuffer
+from ldpc import ldpc_reconcile
+from polar import polar_reconcile
+from privacy import key_blocks, privacy_amplify, stream_privacy_amplify, write_key_stream
+from sequential import FALSE_ABORT_RATE, FALSE_ACCEPT_RATE, SequentialTest
+from transmissions import TransmissionTable, bb84_mismatched_counts, bb84_sift_mask
 
 
 N = 200                    # number of qubits A sends
-SAMPLE_FRACTION = 0.25     # fraction of sifted key revealed for QBER estimation
+SAMPLE_FRACTION = None     # fraction of sifted key revealed (None = optimized for N)
+BASIS_BIAS = None          # probability of the Z basis for A and B (None = optimized)
+EXPECTED_QBER = 0.02       # QBER the session parameters are optimized for
 QBER_THRESHOLD = 0.11      # threshold to abort (illustrative)
+SEQUENTIAL_TEST = True     # reveal check bits during transmission and abort early (SPRT)
+PAULI_ESTIMATION = True    # also fit the channel from the discarded mismatched-basis data
 EVE_ENABLED = False         # toggle Eve on/off
 PRINT_EXAMPLE = 40         # how many transmissions to print in detail
+BACKEND = 'aer_batched'    # 'aer_per_shot', 'aer_batched', 'aer_stabilizer',
+                           # 'aer_grouped', 'cached' or 'numpy' (see backends.py)
+BLOCK_SIZE = 4096          # circuits per batched job / packed circuit
+MAX_PARALLEL_EXPERIMENTS = 0   # Aer experiment parallelism (0 = all cores)
+CIRCUIT_CACHE = None       # QPY file of precompiled circuits (None = memory only)
+NOISE_MODEL = None         # qiskit_aer NoiseModel for the Aer backends
+FUSED_EVE = False          # Eve's measure/resend and B's measurement in one dynamic circuit
+AUDIT_FRACTION = 0.0       # fraction re-run on Aer per shot to audit the backend (0 = off)
+RECONCILIATION = 'cascade' # 'cascade' (interactive), 'ldpc' or 'polar' (one-way)
+CASCADE_PASSES = 4         # Cascade reconciliation passes
+FINAL_KEY_LENGTH = None    # Toeplitz output bits (None = finite-key secure length)
+FINITE_KEY_BOUND = 'serfling' # phase-error sampling bound: 'serfling' or 'hoeffding'
+PA_STREAM_OUTPUT = None    # stream the final key to this file block-wise (None = in memory)
+PA_BLOCK_BITS = 1 << 20    # raw key bits per streamed privacy-amplification block
 
-simulator = AerSimulator()
+backend = get_backend(BACKEND, block_size=BLOCK_SIZE,
+                      max_parallel_experiments=MAX_PARALLEL_EXPERIMENTS,
+                      circuit_cache=CIRCUIT_CACHE, noise_model=NOISE_MODEL,
+                      fused_eve=FUSED_EVE)
+if AUDIT_FRACTION > 0:
+    backend = AuditedBackend(backend, AUDIT_FRACTION, noise_model=NOISE_MODEL)
 
+# Sample fraction and basis bias maximizing the expected finite-key bits per qubit
+session = lookup_parameters(N, EXPECTED_QBER, eps_sec=EPS_SEC, eps_cor=EPS_COR,
+                            method=FINITE_KEY_BOUND)
+sample_fraction = session.sample_fraction if SAMPLE_FRACTION is None else SAMPLE_FRACTION
+basis_bias = session.bias if BASIS_BIAS is None else BASIS_BIAS
 
-def prepare_state(bit: int, basis: str) -> QuantumCircuit:
-    """Return a QuantumCircuit(1,1) preparing 'bit' in basis 'Z' or 'X'."""
-    qc = QuantumCircuit(1, 1)
-    if basis == 'Z':
-        if bit == 1:
-            qc.x(0)
-    elif basis == 'X':
-        if bit == 0:
-            qc.h(0)         # |+>
-        else:
-            qc.x(0)
-            qc.h(0)         # |->
-    else:
-        raise ValueError("basis must be 'Z' or 'X'")
-    return qc
-
-def measure_in_basis(qc_prep: QuantumCircuit, basis: str) -> int:
-    """
-    Measure the prepared circuit qc_prep in basis 'Z' or 'X'.
-    Returns measured bit (0 or 1).
-    """
-    qc = qc_prep.copy()
-    if basis == 'X':
-        qc.h(0)
-    qc.measure(0, 0)
-    job = simulator.run(qc, shots=1)
-    result = job.result()
-    counts = result.get_counts()
-    # single-shot => one key in counts
-    bitstr = list(counts.keys())[0]
-    return int(bitstr)
-
-def privacy_amplify_sha256(bitstring: str) -> str:
-    """Simple demo: compress bitstring with SHA-256 (not real universal hashing)."""
-    if not bitstring:
-        return ''
-    b = int(bitstring, 2).to_bytes((len(bitstring) + 7) // 8, 'big')
-    return hashlib.sha256(b).hexdigest()
-
-
-# 1) A: random bits & bases
-A_bits = [random.randint(0, 1) for _ in range(N)]
-A_bases = [random.choice(['Z', 'X']) for _ in range(N)]
+
+# 1) A: random bits & bases, stored bit-packed in a columnar table
+rng = np.random.default_rng()
+table = TransmissionTable.bb84(N, EVE_ENABLED, check=SEQUENTIAL_TEST)
+for start in range(0, N, BLOCK_SIZE):
+    n = min(BLOCK_SIZE, N - start)
+    table.set('A_bit', random_bits(rng, n), start)
+    table.set('A_basis', random_bases(rng, n, basis_bias), start)
 
 # Print A's choices (partial)
+example = slice(0, PRINT_EXAMPLE)
+A_bits = table.get('A_bit', example).astype(int)
+A_bases = BASIS_LABELS[table.get('A_basis', example).astype(int)]
 print("=== A: preparation ===")
 print(f"Total qubits to send: {N}")
+print(f"Sample fraction: {sample_fraction:.3f}, P(Z basis): {basis_bias:.3f} "
+      f"(expected {session.rate:.3f} secure bits per qubit at {EXPECTED_QBER*100:.1f}% QBER)")
 print("First 40 A bits & bases (index: bit, basis):")
 for i in range(min(PRINT_EXAMPLE, N)):
     print(f"{i:03d}: {A_bits[i]}, {A_bases[i]}")
 print("...")
 
 # 2) Transmission with optional Eve
-B_bases = [random.choice(['Z', 'X']) for _ in range(N)]
-B_results = [None] * N
-eve_bases = [None] * N
-eve_results = [None] * N  # only filled when Eve present
-
 print("\n=== TRANSMISSION (A -> channel -> B). Eve enabled:", EVE_ENABLED, ") ===")
+print(f"Backend: {BACKEND}")
 
-for i in range(N):
-    # A prepares
-    qc_A = prepare_state(A_bits[i], A_bases[i])
-
+# Sequential test of EXPECTED_QBER against QBER_THRESHOLD on check bits revealed
+# from every block's sifted positions (they become the estimation sample)
+sprt = SequentialTest(EXPECTED_QBER, QBER_THRESHOLD) if SEQUENTIAL_TEST else None
+sent = N
+for start in range(0, N, BLOCK_SIZE):
+    block = slice(start, min(start + BLOCK_SIZE, N))
+    n = block.stop - start
+    B_bases = random_bases(rng, n, basis_bias)
+    # Eve intercepts every qubit, measures in a random basis and resends
+    eve_bases = random_bits(rng, n) if EVE_ENABLED else None
+    block_bits, block_bases = table.get('A_bit', block), table.get('A_basis', block)
+    B_results, eve_results = backend.bb84_block(block_bits, block_bases, B_bases, eve_bases)
+    table.set('B_basis', B_bases, start)
+    table.set('B_result', B_results, start)
     if EVE_ENABLED:
-        # Eve intercepts the qubit
-        eve_basis = random.choice(['Z', 'X'])
-        eve_bases[i] = eve_basis
-        eve_meas = measure_in_basis(qc_A, eve_basis)   # Eve measures -> collapse
-        eve_results[i] = eve_meas
-
-        # Eve resends a newly prepared qubit based on her measurement outcome & basis
-        qc_after_eve = prepare_state(eve_meas, eve_basis)
-        # B measures the resent qubit
-        B_meas = measure_in_basis(qc_after_eve, B_bases[i])
-        B_results[i] = B_meas
-    else:
-        # No Eve: B measures A's prepared qubit directly
-        B_meas = measure_in_basis(qc_A, B_bases[i])
-        B_results[i] = B_meas
+        table.set('eve_basis', eve_bases, start)
+        table.set('eve_result', eve_results, start)
+    if sprt is not None:
+        check = (block_bases == B_bases) & (rng.random(n) < sample_fraction)
+        table.set('check', check, start)
+        if sprt.update((block_bits != B_results)[check]):
+            sent = block.stop
+            break
+backend.close()
+if AUDIT_FRACTION > 0:
+    print(f"Audit: {backend.audited} transmissions re-run on Aer, p = {backend.p_value:.3g}")
+if sprt is not None:
+    print(f"Sequential test: {sprt.errors} errors in {sprt.checks} check bits, "
+          f"decision: {sprt.decision or 'undecided'}")
+    if sprt.aborted:
+        print(f"ABORT after {sent} of {N} qubits: the check bits favour QBER {QBER_THRESHOLD*100:.1f}% "
+              f"over {EXPECTED_QBER*100:.1f}% (false-abort rate {FALSE_ABORT_RATE:g}, "
+              f"false-accept rate {FALSE_ACCEPT_RATE:g}). Possible eavesdropping.")
+        print("\nEnd of BB84 simulation.")
+        sys.exit()
+print(f"Transmission table: {table.nbytes} bytes ({8 * table.nbytes / max(N, 1):.1f} bits per qubit)")
 
 # Print some examples of transmission results
 print("\nFirst 40 transmissions (index: A_bit A_basis | EveBasis EveMeas | B_basis B_meas):")
+B_bases = BASIS_LABELS[table.get('B_basis', example).astype(int)]
+B_results = table.get('B_result', example).astype(int)
+if EVE_ENABLED:
+    eve_bases = BASIS_LABELS[table.get('eve_basis', example).astype(int)]
+    eve_results = table.get('eve_result', example).astype(int)
 for i in range(min(PRINT_EXAMPLE, N)):
     a_bit = A_bits[i]
     a_basis = A_bases[i]
@@ -112,13 +139,16 @@ for i in range(min(PRINT_EXAMPLE, N)):
 # -----------------------------
 # 3) Sifting: basis reconciliation
 # -----------------------------
-sift_positions = [i for i in range(N) if A_bases[i] == B_bases[i]]
-sifted_A = [A_bits[i] for i in sift_positions]
-sifted_B   = [B_results[i] for i in sift_positions]
+sift_mask = bb84_sift_mask(table)
+sift_positions = table.positions(sift_mask, 40).tolist()
+sifted_A = KeyBuffer.from_bits(table.select('A_bit', sift_mask))
+sifted_B = KeyBuffer.from_bits(table.select('B_result', sift_mask))
+sifted_basis = KeyBuffer.from_bits(table.select('A_basis', sift_mask))     # 1 = X
+errors = sifted_A ^ sifted_B
 
 print("\n=== SIFTING ===")
 print(f"Total sent: {N}")
-print(f"Positions where A and B used same basis (sifted): {len(sift_positions)}")
+print(f"Positions where A and B used same basis (sifted): {len(sifted_A)}")
 print("Sifted indices (first 40):", sift_positions[:40])
 
 # -----------------------------
@@ -128,12 +158,15 @@ sift_len = len(sifted_A)
 if sift_len == 0:
     raise RuntimeError("No sifted bits. Increase N or check code.")
 
-sample_size = max(1, int(SAMPLE_FRACTION * sift_len))
-sample_indices = random.sample(range(sift_len), sample_size)
-
-# compute mismatches on sample
-mismatches = sum(1 for idx in sample_indices if sifted_A[idx] != sifted_B[idx])
-QBER = mismatches / sample_size
+# reveal a random sample (the online check bits, if any), count its mismatches
+# and strip it from the keys
+check_mask = KeyBuffer.from_bits(table.select('check', sift_mask)) if SEQUENTIAL_TEST else None
+if check_mask is not None and check_mask.weight() > 0:
+    estimate = estimate_from_sample(sifted_A, sifted_B, check_mask)
+else:
+    estimate = estimate_parameters(sifted_A, sifted_B, sample_fraction, rng)
+sample_size, mismatches, QBER = estimate.sample_size, estimate.mismatches, estimate.qber
+raw_A_key, raw_B_key = estimate.raw_A_key, estimate.raw_B_key
 
 print("\n=== PARAMETER ESTIMATION ===")
 print(f"Sifted key length         : {sift_len}")
@@ -141,10 +174,23 @@ print(f"Sample size (to reveal)  : {sample_size}")
 print(f"Mismatches in sample      : {mismatches}")
 print(f"Measured QBER (sample)    : {QBER*100:.2f}%")
 
-# Remove sample bits from key (they were revealed)
-remaining_indices = [i for i in range(sift_len) if i not in sample_indices]
-raw_A_key = ''.join(str(sifted_A[i]) for i in remaining_indices)
-raw_B_key   = ''.join(str(sifted_B[i])   for i in remaining_indices)
+# per-basis rates: Z sample errors are bit errors, X sample errors the phase
+# errors of the Z key (95% Clopper-Pearson intervals)
+basis = per_basis_estimates(sifted_A, sifted_B, sifted_basis, estimate.sample_mask)
+for label, rate in (('bit error (Z)', basis.Z), ('phase error (X)', basis.X)):
+    print(f"{label:<16}: {rate.errors}/{rate.trials} = {rate.rate*100:.2f}% "
+          f"[{rate.low*100:.2f}%, {rate.high*100:.2f}%]")
+if PAULI_ESTIMATION:
+    # mismatched-basis transmissions were discarded at sifting and reveal no key bits
+    channel = pauli_channel(basis, *bb84_mismatched_counts(table))
+    R = channel.correlations
+    print("Correlations (rows B basis, cols A basis Z/X):",
+          np.array2string(R, precision=4).replace('\n', ''))
+    print(f"Frame rotation: {np.degrees(channel.rotation):.2f} deg, "
+          f"aligned lambda_z={channel.eigenvalues[0]:.4f}, lambda_x={channel.eigenvalues[1]:.4f}")
+    p_I, p_X, p_Y, p_Z = channel.probabilities
+    print(f"Pauli channel: p_I={p_I:.4f} p_X={p_X:.4f} p_Y={p_Y:.4f} p_Z={p_Z:.4f} "
+          f"(p_Y within [{channel.p_Y_range[0]:.4f}, {channel.p_Y_range[1]:.4f}])")
 
 # -----------------------------
 # 5) Decision and demo privacy amplification
@@ -154,23 +200,64 @@ if QBER > QBER_THRESHOLD:
     print(f"QBER ({QBER*100:.2f}%) exceeds threshold ({QBER_THRESHOLD*100:.2f}%). ABORT: possible eavesdropping.")
 else:
     print(f"QBER ({QBER*100:.2f}%) within threshold ({QBER_THRESHOLD*100:.2f}%). Proceed.")
-
-    # NOTE: Error correction (reconciliation) is required in practice. Here we only demo.
-    if raw_A_key == raw_B_key:
-        print("Raw keys already match (no error-correction needed).")
+    # Error correction: B reconciles his key with A's. A sample without errors
+    # still bounds the QBER at ~1/sample_size, which sizes Cascade blocks. One-way
+    # codes cannot recover from an underestimate, so they are sized for the
+    # upper confidence bound of the QBER.
+    if RECONCILIATION in ('ldpc', 'polar'):
+        reconcile = ldpc_reconcile if RECONCILIATION == 'ldpc' else polar_reconcile
+        qber_high = rate_estimate(mismatches, sample_size).high
+        reconciled = reconcile(raw_A_key, raw_B_key, qber_high, rng=rng)
+        raw_A_key, raw_B_key = reconciled.key_A, reconciled.key
+        print(f"{RECONCILIATION}: {reconciled.frames} frames, {reconciled.failed_frames} failed and dropped, "
+              f"disclosed {reconciled.leaked} bits ({reconciled.throughput:.2f} Mbit/s)")
     else:
-        print("Raw keys differ (error-correction would be required in practice).")
-        # For a toy demonstration we won't implement full error-correction here.
-
-    print(f"Raw key length (after removing sample): {len(raw_A_key)}")
-    # Privacy-amplify (demo with SHA-256)
-    final_key_hex = privacy_amplify_sha256(raw_A_key)
-    print("Demo final key (SHA-256 hex of raw key):", final_key_hex)
+        reconciled = cascade(raw_A_key, raw_B_key, max(QBER, 1 / sample_size), CASCADE_PASSES, rng)
+        raw_B_key = reconciled.key
+        print(f"Cascade: corrected {reconciled.corrected} bits, disclosed {reconciled.leaked} parities "
+              f"in {reconciled.round_trips} round trips ({reconciled.throughput:.2f} Mbit/s)")
+    # Verification: A and B compare a hash of their keys (the eps_cor term); here
+    # the keys are compared directly. Residual errors discard the whole key.
+    if raw_A_key != raw_B_key:
+        print(f"Verification failed: residual errors after {RECONCILIATION} reconciliation. "
+              f"ABORT: key discarded.")
+    else:
+        # Finite-key length per basis: phase errors of the Z key bits are bounded from
+        # the X sample and vice versa, minus the reconciliation leak and the
+        # leftover-hash / verification terms. Key bits per basis are scaled when
+        # reconciliation drops frames.
+        sample = estimate.sample_mask
+        k_Z, e_Z, k_X, e_X = basis.Z.trials, basis.Z.errors, basis.X.trials, basis.X.errors
+        n_X = (sifted_basis & ~sample).weight() * len(raw_A_key) // max(1, sift_len - sample_size)
+        n_Z = len(raw_A_key) - n_X
+        phase_Z = float(phase_error_bound(n_Z, k_X, e_X, EPS_SEC / 2, FINITE_KEY_BOUND))
+        phase_X = float(phase_error_bound(n_X, k_Z, e_Z, EPS_SEC / 2, FINITE_KEY_BOUND))
+        secure_len = int(two_basis_key_length(n_Z, n_X, k_Z, k_X, e_Z, e_X, reconciled.leaked,
+                                              EPS_SEC, EPS_COR, FINITE_KEY_BOUND))
+        # a bound of 50% or more (or none at all: empty sample) says nothing about Eve
+        bound_Z, bound_X = (f"{q*100:.2f}%" if q < 0.5 else "none (sample too small)"
+                            for q in (phase_Z, phase_X))
+        print(f"Finite-key: phase-error bounds Z {bound_Z}, X {bound_X}, "
+              f"secure length {secure_len} bits "
+              f"(eps_sec={EPS_SEC:g}, eps_cor={EPS_COR:g})")
+        if secure_len == 0:
+            print("No secure key can be extracted at this block size.")
+        final_len = secure_len if FINAL_KEY_LENGTH is None else FINAL_KEY_LENGTH
+        if PA_STREAM_OUTPUT is None:
+            final_key, _ = privacy_amplify(raw_A_key, final_len, rng)
+            print(f"Final key length (Toeplitz hash): {len(final_key)}")
+            print("Final key (hex, first 64 chars):", final_key.tobytes().hex()[:64])
+        else:
+            # one Toeplitz hash per block at the same compression ratio, written incrementally
+            ratio = final_len / max(1, len(raw_A_key))
+            final_bits = write_key_stream(stream_privacy_amplify(key_blocks(raw_A_key, PA_BLOCK_BITS),
+                                                                 ratio, rng), PA_STREAM_OUTPUT)
+            print(f"Final key length (block-wise Toeplitz hash): {final_bits}, written to {PA_STREAM_OUTPUT}")
 
 # -----------------------------
 # Summary statistics and notes
 # -----------------------------
-total_mismatches_full = sum(1 for a,b in zip(sifted_A, sifted_B) if a != b)
+total_mismatches_full = errors.weight()
 full_qber = total_mismatches_full / sift_len
 print("\n=== SUMMARY ===")
 print(f"Sifted bits             : {sift_len}")
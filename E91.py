@@ -1,93 +1,130 @@
-import random
-import hashlib
-from qiskit import QuantumCircuit
-from qiskit_aer import AerSimulator
-from math import pi
+import sys
+
+import numpy as np
+
+from analytic import ANGLES_A, ANGLES_B, ANGLES_EVE, random_settings
+from audit import AuditedBackend
+from backends import get_backend
+from bell import CLASSICAL_BOUND, QUANTUM_BOUND, chsh_test, setting_counts
+from cascade import cascade
+from estimation import estimate_from_sample, estimate_parameters, rate_estimate
+from finite_key import EPS_COR, EPS_SEC, lookup_parameters, phase_error_bound, secure_key_length
+from keybuffer import KeyBuffer
+from ldpc import ldpc_reconcile
+from polar import polar_reconcile
+from privacy import key_blocks, privacy_amplify, stream_privacy_amplify, write_key_stream
+from sequential import FALSE_ABORT_RATE, FALSE_ACCEPT_RATE, SequentialTest
+from transmissions import TransmissionTable, e91_sift_mask
 
 
 N = 200                    # Number of entangled pairs
-SAMPLE_FRACTION = 0.25     # Fraction of sifted key revealed for QBER estimation
+SAMPLE_FRACTION = None     # Fraction of sifted key revealed (None = optimized for N)
+EXPECTED_QBER = 0.02       # QBER the sample fraction is optimized for
 QBER_THRESHOLD = 0.11      # Threshold to abort
+SEQUENTIAL_TEST = True     # Reveal check bits during transmission and abort early (SPRT)
+BELL_TEST = True           # CHSH test on the non-key pairs; abort without a significant violation
 EVE_ENABLED = True        # Toggle Eve on/off
 PRINT_EXAMPLE = 40
+BACKEND = 'aer_per_shot'  # 'aer_per_shot', 'aer_batched', 'aer_stabilizer', 'aer_grouped',
+                          # 'aer_parameterized', 'cached' or 'numpy' (see backends.py)
+BLOCK_SIZE = 4096         # circuits / parameter bindings per Aer job
+MAX_PARALLEL_EXPERIMENTS = 0   # Aer experiment parallelism (0 = all cores)
+CIRCUIT_CACHE = None      # QPY file of precompiled circuits (None = memory only)
+NOISE_MODEL = None        # qiskit_aer NoiseModel for the Aer backends
+FUSED_EVE = False         # Eve's measure/resend and A/B's measurement in one dynamic circuit
+AUDIT_FRACTION = 0.0      # fraction re-run on Aer per shot to audit the backend (0 = off)
+RECONCILIATION = 'cascade'# 'cascade' (interactive), 'ldpc' or 'polar' (one-way)
+CASCADE_PASSES = 4        # Cascade reconciliation passes
+FINAL_KEY_LENGTH = None   # Toeplitz output bits (None = finite-key secure length)
+FINITE_KEY_BOUND = 'serfling' # phase-error sampling bound: 'serfling' or 'hoeffding'
+PA_STREAM_OUTPUT = None   # stream the final key to this file block-wise (None = in memory)
+PA_BLOCK_BITS = 1 << 20   # raw key bits per streamed privacy-amplification block
+
+backend = get_backend(BACKEND, block_size=BLOCK_SIZE,
+                      max_parallel_experiments=MAX_PARALLEL_EXPERIMENTS,
+                      circuit_cache=CIRCUIT_CACHE, noise_model=NOISE_MODEL,
+                      fused_eve=FUSED_EVE)
+if AUDIT_FRACTION > 0:
+    backend = AuditedBackend(backend, AUDIT_FRACTION, noise_model=NOISE_MODEL)
+
+# Sample fraction maximizing the expected finite-key bits per pair; pairs with
+# a common angle are sifted
+sift_ratio = np.isclose(ANGLES_A[:, None], ANGLES_B[None, :]).mean()
+session = lookup_parameters(N, EXPECTED_QBER, sift_ratio, optimize_bias=False, eps_sec=EPS_SEC,
+                            eps_cor=EPS_COR, method=FINITE_KEY_BOUND)
+sample_fraction = session.sample_fraction if SAMPLE_FRACTION is None else SAMPLE_FRACTION
 
-simulator = AerSimulator()
-
-
-def prepare_bell_pair() -> QuantumCircuit:
-    """Prepare a Bell state |Φ+>"""
-    qc = QuantumCircuit(2, 2)
-    qc.h(0)
-    qc.cx(0, 1)
-    return qc
-
-def measure_bell_pair(qc: QuantumCircuit, angle_A: float, angle_B: float):
-    """
-    Measure both qubits in their respective rotated bases simultaneously.
-    Returns (bit_A, bit_B)
-    """
-    qc_r = qc.copy()
-    qc_r.ry(-2*angle_A, 0)
-    qc_r.ry(-2*angle_B, 1)
-    qc_r.measure([0,1], [0,1])
-    job = simulator.run(qc_r, shots=1)
-    counts = job.result().get_counts()
-    bits = list(counts.keys())[0]
-    # Qiskit counts in little-endian: bits[0] = qubit 1, bits[1] = qubit 0
-    return int(bits[1]), int(bits[0])  # (A,B)
-
-def privacy_amplify_sha256(bitstring: str) -> str:
-    """Demo: compress bitstring using SHA-256"""
-    if not bitstring:
-        return ''
-    b = int(bitstring, 2).to_bytes((len(bitstring) + 7) // 8, 'big')
-    return hashlib.sha256(b).hexdigest()
 
 # 1) Generate entangled pairs & choose measurement angles
-angles_A = [random.choice([0, pi/4, pi/2]) for _ in range(N)]
-angles_B = [random.choice([pi/4, pi/2, 3*pi/4]) for _ in range(N)]
-
-results_A = []
-results_B = []
-eve_results = []
-eve_angles = []
+# settings are indices into ANGLES_A = [0, pi/8, pi/4] and ANGLES_B = [pi/8, pi/4, 3*pi/8],
+# stored bit-packed in a columnar table
+rng = np.random.default_rng()
+table = TransmissionTable.e91(N, EVE_ENABLED, check=SEQUENTIAL_TEST)
 
 print("=== TRANSMISSION & MEASUREMENT ===")
-for i in range(N):
-    qc = prepare_bell_pair()
-
-    # Eve intercepts B's qubit
+print(f"Backend: {BACKEND}")
+print(f"Sample fraction: {sample_fraction:.3f} (expected {session.rate:.3f} secure bits per pair "
+      f"at {EXPECTED_QBER*100:.1f}% QBER)")
+# Sequential test of EXPECTED_QBER against QBER_THRESHOLD on check bits revealed
+# from every block's sifted pairs (they become the estimation sample)
+sprt = SequentialTest(EXPECTED_QBER, QBER_THRESHOLD) if SEQUENTIAL_TEST else None
+sent = N
+for start in range(0, N, BLOCK_SIZE):
+    n = min(BLOCK_SIZE, N - start)
+    settings_A = random_settings(rng, n, len(ANGLES_A))
+    settings_B = random_settings(rng, n, len(ANGLES_B))
+    # Eve intercepts B's qubit, measures it along a random angle and resends it
+    eve_settings = random_settings(rng, n, len(ANGLES_EVE)) if EVE_ENABLED else None
+    results_A, results_B, eve_results = backend.e91_block(settings_A, settings_B, eve_settings)
+    table.set('A_setting', settings_A, start)
+    table.set('B_setting', settings_B, start)
+    table.set('A_result', results_A, start)
+    table.set('B_result', results_B, start)
     if EVE_ENABLED:
-        eve_angle = random.choice([pi/4, pi/2, 3*pi/4])
-        eve_angles.append(eve_angle)
-        # Measure B's qubit alone
-        qc_eve = qc.copy()
-        qc_eve.ry(-2*eve_angle, 1)
-        qc_eve.measure(1,1)
-        job = simulator.run(qc_eve, shots=1)
-        eve_meas = int(list(job.result().get_counts().keys())[0])
-        eve_results.append(eve_meas)
-        # Eve resends B’s qubit
-        qc = QuantumCircuit(2,2)
-        if eve_meas == 1:
-            qc.x(1)
-
-    # Measure both qubits simultaneously
-    a_meas, b_meas = measure_bell_pair(qc, angles_A[i], angles_B[i])
-    results_A.append(a_meas)
-    results_B.append(b_meas)
-
-    # Print first examples
-    if i < PRINT_EXAMPLE:
-        if EVE_ENABLED:
-            print(f"{i:03d}: Angle A={angles_A[i]:.2f}, Angle B={angles_B[i]:.2f} | EveAngle={eve_angles[i]:.2f}, EveMeas={eve_results[i]} -> A={a_meas}, B={b_meas}")
-        else:
-            print(f"{i:03d}: Angle A={angles_A[i]:.2f}, Angle B={angles_B[i]:.2f} -> A={a_meas}, B={b_meas}")
+        table.set('eve_setting', eve_settings, start)
+        table.set('eve_result', eve_results, start)
+    if sprt is not None:
+        sifted = np.isclose(ANGLES_A[settings_A], ANGLES_B[settings_B])
+        check = sifted & (rng.random(n) < sample_fraction)
+        table.set('check', check, start)
+        if sprt.update((results_A != results_B)[check]):
+            sent = start + n
+            break
+backend.close()
+if AUDIT_FRACTION > 0:
+    print(f"Audit: {backend.audited} transmissions re-run on Aer, p = {backend.p_value:.3g}")
+if sprt is not None:
+    print(f"Sequential test: {sprt.errors} errors in {sprt.checks} check bits, "
+          f"decision: {sprt.decision or 'undecided'}")
+    if sprt.aborted:
+        print(f"ABORT after {sent} of {N} pairs: the check bits favour QBER {QBER_THRESHOLD*100:.1f}% "
+              f"over {EXPECTED_QBER*100:.1f}% (false-abort rate {FALSE_ABORT_RATE:g}, "
+              f"false-accept rate {FALSE_ACCEPT_RATE:g}). Possible eavesdropping.")
+        print("\nEnd of E91 simulation.")
+        sys.exit()
+print(f"Transmission table: {table.nbytes} bytes ({8 * table.nbytes / max(N, 1):.1f} bits per pair)")
+
+# Print first examples
+example = slice(0, PRINT_EXAMPLE)
+angles_A = ANGLES_A[table.get('A_setting', example)]
+angles_B = ANGLES_B[table.get('B_setting', example)]
+results_A = table.get('A_result', example).astype(int)
+results_B = table.get('B_result', example).astype(int)
+if EVE_ENABLED:
+    eve_angles = ANGLES_EVE[table.get('eve_setting', example)]
+    eve_results = table.get('eve_result', example).astype(int)
+for i in range(min(PRINT_EXAMPLE, N)):
+    if EVE_ENABLED:
+        print(f"{i:03d}: Angle A={angles_A[i]:.2f}, Angle B={angles_B[i]:.2f} | EveAngle={eve_angles[i]:.2f}, EveMeas={eve_results[i]} -> A={results_A[i]}, B={results_B[i]}")
+    else:
+        print(f"{i:03d}: Angle A={angles_A[i]:.2f}, Angle B={angles_B[i]:.2f} -> A={results_A[i]}, B={results_B[i]}")
 
 # 2) SIFTING: keep only pairs where bases match
-sift_positions = [i for i in range(N) if angles_A[i] == angles_B[i]]
-sifted_A = [results_A[i] for i in sift_positions]
-sifted_B = [results_B[i] for i in sift_positions]
+sift_mask = e91_sift_mask(table)
+sift_positions = table.positions(sift_mask, PRINT_EXAMPLE).tolist()
+sifted_A = KeyBuffer.from_bits(table.select('A_result', sift_mask))
+sifted_B = KeyBuffer.from_bits(table.select('B_result', sift_mask))
+errors = sifted_A ^ sifted_B
 
 print("\n=== SIFTING ===")
 print(f"Sifted key positions (first 40): {sift_positions[:PRINT_EXAMPLE]}")
@@ -98,37 +135,93 @@ sift_len = len(sifted_A)
 if sift_len == 0:
     raise RuntimeError("No sifted bits. Increase N or adjust angles.")
 
-sample_size = max(1, int(SAMPLE_FRACTION * sift_len))
-sample_indices = random.sample(range(sift_len), sample_size)
-mismatches = sum(1 for idx in sample_indices if sifted_A[idx] != sifted_B[idx])
-QBER = mismatches / sample_size
+# mismatches on the revealed sample (the online check bits, if any); the sample
+# is removed from both keys
+check_mask = KeyBuffer.from_bits(table.select('check', sift_mask)) if SEQUENTIAL_TEST else None
+if check_mask is not None and check_mask.weight() > 0:
+    estimate = estimate_from_sample(sifted_A, sifted_B, check_mask)
+else:
+    estimate = estimate_parameters(sifted_A, sifted_B, sample_fraction, rng)
+sample_size, mismatches, QBER = estimate.sample_size, estimate.mismatches, estimate.qber
+raw_A_key, raw_B_key = estimate.raw_A_key, estimate.raw_B_key
 
 print("\n=== PARAMETER ESTIMATION ===")
 print(f"Sample size: {sample_size}, Mismatches: {mismatches}, QBER: {QBER*100:.2f}%")
 
-# Remove sample bits from key
-remaining_indices = [i for i in range(sift_len) if i not in sample_indices]
-raw_A_key = ''.join(str(sifted_A[i]) for i in remaining_indices)
-raw_B_key = ''.join(str(sifted_B[i]) for i in remaining_indices)
+# 3b) Bell test: CHSH value from the non-key pairs discarded at sifting
+if BELL_TEST:
+    key_pairs = np.isclose(ANGLES_A[:, None], ANGLES_B[None, :])
+    bell = chsh_test(setting_counts(table), rng=rng, key_pairs=key_pairs)
+    print("\n=== BELL TEST (CHSH) ===")
+    print("E(a_i, b_j) (rows a1..a3, cols b1..b3, key pairs hidden):")
+    for i, row in enumerate(bell.correlations):
+        print(f"  a{i + 1}: " + "  ".join('    key' if np.isnan(E) else f"{E:+.4f}" for E in row))
+    print(f"S = {bell.S:.4f}, 95% CI [{bell.low:.4f}, {bell.high:.4f}] from {bell.pairs} pairs "
+          f"(classical bound {CLASSICAL_BOUND:g}, quantum {QUANTUM_BOUND:.4f})")
 
 # 4) Decision and privacy amplification
 print("\n=== DECISION ===")
 if QBER > QBER_THRESHOLD:
     print(f"QBER ({QBER*100:.2f}%) exceeds threshold ({QBER_THRESHOLD*100:.2f}%). ABORT: possible eavesdropping.")
+elif BELL_TEST and not bell.violated:
+    print(f"No significant Bell violation (S lower bound {bell.low:.4f} <= {CLASSICAL_BOUND:g}). "
+          f"ABORT: correlations may be classical.")
 else:
     print(f"QBER ({QBER*100:.2f}%) within threshold. Proceed.")
-    final_key_hex = privacy_amplify_sha256(raw_A_key)
-    print("Demo final key (SHA-256 hex):", final_key_hex)
+    # Error correction: B reconciles his key with A's. A sample without errors
+    # still bounds the QBER at ~1/sample_size, which sizes Cascade blocks. One-way
+    # codes cannot recover from an underestimate, so they are sized for the
+    # upper confidence bound of the QBER.
+    if RECONCILIATION in ('ldpc', 'polar'):
+        reconcile = ldpc_reconcile if RECONCILIATION == 'ldpc' else polar_reconcile
+        qber_high = rate_estimate(mismatches, sample_size).high
+        reconciled = reconcile(raw_A_key, raw_B_key, qber_high, rng=rng)
+        raw_A_key, raw_B_key = reconciled.key_A, reconciled.key
+        print(f"{RECONCILIATION}: {reconciled.frames} frames, {reconciled.failed_frames} failed and dropped, "
+              f"disclosed {reconciled.leaked} bits ({reconciled.throughput:.2f} Mbit/s)")
+    else:
+        reconciled = cascade(raw_A_key, raw_B_key, max(QBER, 1 / sample_size), CASCADE_PASSES, rng)
+        raw_B_key = reconciled.key
+        print(f"Cascade: corrected {reconciled.corrected} bits, disclosed {reconciled.leaked} parities "
+              f"in {reconciled.round_trips} round trips ({reconciled.throughput:.2f} Mbit/s)")
+    # Verification: A and B compare a hash of their keys (the eps_cor term); here
+    # the keys are compared directly. Residual errors discard the whole key.
+    if raw_A_key != raw_B_key:
+        print(f"Verification failed: residual errors after {RECONCILIATION} reconciliation. "
+              f"ABORT: key discarded.")
+    else:
+        # Finite-key length: phase errors of the n key bits bounded from the sample,
+        # minus the reconciliation leak and the leftover-hash / verification terms
+        phase_bound = float(phase_error_bound(len(raw_A_key), sample_size, mismatches, EPS_SEC,
+                                              FINITE_KEY_BOUND))
+        secure_len = int(secure_key_length(len(raw_A_key), sample_size, mismatches, reconciled.leaked,
+                                           EPS_SEC, EPS_COR, FINITE_KEY_BOUND))
+        # a bound of 50% or more (or none at all: empty sample) says nothing about Eve
+        bound = f"{phase_bound*100:.2f}%" if phase_bound < 0.5 else "none (sample too small)"
+        print(f"Finite-key: phase-error bound {bound}, secure length {secure_len} bits "
+              f"(eps_sec={EPS_SEC:g}, eps_cor={EPS_COR:g})")
+        if secure_len == 0:
+            print("No secure key can be extracted at this block size.")
+        final_len = secure_len if FINAL_KEY_LENGTH is None else FINAL_KEY_LENGTH
+        if PA_STREAM_OUTPUT is None:
+            final_key, _ = privacy_amplify(raw_A_key, final_len, rng)
+            print(f"Final key: {len(final_key)} bits (Toeplitz hash of {len(raw_A_key)} raw bits)")
+            print("Final key (hex, first 64 chars):", final_key.tobytes().hex()[:64])
+        else:
+            ratio = final_len / max(1, len(raw_A_key))
+            final_bits = write_key_stream(stream_privacy_amplify(key_blocks(raw_A_key, PA_BLOCK_BITS),
+                                                                 ratio, rng), PA_STREAM_OUTPUT)
+            print(f"Final key: {final_bits} bits (block-wise Toeplitz hash), written to {PA_STREAM_OUTPUT}")
 
 # SUMMARY
-total_mismatches_full = sum(1 for a,b in zip(sifted_A, sifted_B) if a != b)
+total_mismatches_full = errors.weight()
 full_qber = total_mismatches_full / sift_len
 print("\n=== SUMMARY ===")
 print(f"Sifted bits: {sift_len}")
 print(f"Total mismatches (full): {total_mismatches_full}")
 print(f"Full QBER: {full_qber*100:.2f}%")
 if EVE_ENABLED:
-    print("Note: With Eve intercept-resend, QBER is expected to increase (~25%).")
+    print("Note: With Eve intercept-resend, QBER is expected to increase (~50% for this resend model).")
 else:
     print("Note: With no Eve, QBER should be ~0% (only simulator noise).")
 
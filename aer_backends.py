@@ -0,0 +1,236 @@
+"""
+Aer-based simulation backends (see backends.py for the block API).
+
+Each transmission is described by a small integer signature, and the circuit
+for a signature is built once by the CircuitLibrary. Backends only differ in
+how they execute a block of signatures (execute()).
+
+Signatures:
+    BB84       bit + 2*prep_X + 4*meas_X (+ 8*eve_X for the fused Eve circuit)
+    E91 pair   a + nA*b (+ nA*nB*e, where e is Eve's bit for the resent pair
+               or Eve's setting for the fused circuit)
+    E91 Eve    Eve's setting
+"""
+from typing import Callable
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit_aer import AerSimulator
+
+from aer_batch import (BLOCK_SIZE, MAX_PARALLEL_EXPERIMENTS, run_batched, run_grouped,
+                       run_packed, run_parameter_binds)
+from analytic import ANGLES_A, ANGLES_B, ANGLES_EVE
+from backends import Backend
+from circuit_library import CircuitLibrary
+from circuits import (bell_pair_circuit, bell_pair_template, eve_circuit, eve_template,
+                      intercept_circuit, intercept_resend_circuit, intercept_template,
+                      measurement_circuit, prepare_state, resend_circuit, resend_template,
+                      theta_A, theta_B, theta_eve, phi_resend)
+from distribution_cache import MAX_ENTRIES, DistributionCache
+
+
+BASES = 'ZX'
+N_A, N_B = len(ANGLES_A), len(ANGLES_B)
+
+
+class AerBackend(Backend):
+    """Common signature/circuit handling for the Aer backends."""
+
+    def __init__(self, seed=None, block_size: int = BLOCK_SIZE, fused_eve: bool = False,
+                 circuit_cache=None, noise_model=None,
+                 max_parallel_experiments: int = MAX_PARALLEL_EXPERIMENTS, **options):
+        super().__init__(seed, **options)
+        self.block_size = block_size
+        self.fused_eve = fused_eve
+        self.circuit_cache = circuit_cache
+        self.noise_model = noise_model
+        self.max_parallel_experiments = max_parallel_experiments
+        self.simulator = AerSimulator(noise_model=noise_model)
+        self.library = CircuitLibrary(circuit_cache, self.simulator)
+
+    def execute(self, signatures: np.ndarray,
+                build: Callable[[int], QuantumCircuit]) -> np.ndarray:
+        """Run the circuit build(sig) once per signature. Returns register values."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        if self.circuit_cache is not None and self.library.dirty:
+            self.library.save()
+
+    # -----------------------------
+    # circuits by signature
+    # -----------------------------
+    def bb84_circuit(self, code: int) -> QuantumCircuit:
+        bit, prep, meas = int(code) & 1, BASES[code >> 1 & 1], BASES[code >> 2 & 1]
+        return self.library.get(('bb84', bit, prep, meas),
+                                lambda: measurement_circuit(prepare_state(bit, prep), meas))
+
+    def bb84_intercept_circuit(self, code: int) -> QuantumCircuit:
+        bit, prep, meas = int(code) & 1, BASES[code >> 1 & 1], BASES[code >> 2 & 1]
+        eve = BASES[code >> 3 & 1]
+        return self.library.get(('bb84_eve', bit, prep, eve, meas),
+                                lambda: intercept_resend_circuit(bit, prep, eve, meas))
+
+    def e91_bell_circuit(self, code: int) -> QuantumCircuit:
+        a, b = ANGLES_A[code % N_A], ANGLES_B[code // N_A]
+        return self.library.get(('e91', a, b), lambda: bell_pair_circuit(a, b))
+
+    def e91_eve_circuit(self, code: int) -> QuantumCircuit:
+        e = ANGLES_EVE[code]
+        return self.library.get(('e91_eve', e), lambda: eve_circuit(e))
+
+    def e91_resend_circuit(self, code: int) -> QuantumCircuit:
+        a, b, e = ANGLES_A[code % N_A], ANGLES_B[code // N_A % N_B], int(code) // (N_A * N_B)
+        return self.library.get(('e91_resend', e, a, b), lambda: resend_circuit(e, a, b))
+
+    def e91_intercept_circuit(self, code: int) -> QuantumCircuit:
+        a, b = ANGLES_A[code % N_A], ANGLES_B[code // N_A % N_B]
+        e = ANGLES_EVE[code // (N_A * N_B)]
+        return self.library.get(('e91_intercept', e, a, b), lambda: intercept_circuit(e, a, b))
+
+    # -----------------------------
+    # block API
+    # -----------------------------
+    def bb84_block(self, A_bits, A_bases, B_bases, eve_bases=None):
+        A_bits = np.asarray(A_bits, dtype=np.int64)
+        A_bases = np.asarray(A_bases, dtype=np.int64)
+        B_bases = np.asarray(B_bases, dtype=np.int64)
+        if eve_bases is None:
+            codes = self.execute(A_bits + 2 * A_bases + 4 * B_bases, self.bb84_circuit)
+            return codes.astype(bool), None
+        eve_bases = np.asarray(eve_bases, dtype=np.int64)
+        if self.fused_eve:
+            codes = self.execute(A_bits + 2 * A_bases + 4 * B_bases + 8 * eve_bases,
+                                 self.bb84_intercept_circuit)
+            return (codes >> 1 & 1).astype(bool), (codes & 1).astype(bool)
+        # Eve measures, then B measures the qubit she resent in her basis
+        eve_results = self.execute(A_bits + 2 * A_bases + 4 * eve_bases, self.bb84_circuit)
+        B_results = self.execute(eve_results + 2 * eve_bases + 4 * B_bases, self.bb84_circuit)
+        return B_results.astype(bool), eve_results.astype(bool)
+
+    def e91_block(self, A_settings, B_settings, eve_settings=None):
+        pair = np.asarray(A_settings, dtype=np.int64) + N_A * np.asarray(B_settings, dtype=np.int64)
+        eve_results = None
+        if eve_settings is None:
+            codes = self.execute(pair, self.e91_bell_circuit)
+        elif self.fused_eve:
+            eve_settings = np.asarray(eve_settings, dtype=np.int64)
+            codes = self.execute(pair + N_A * N_B * eve_settings, self.e91_intercept_circuit)
+            eve_results = (codes >> 2 & 1).astype(bool)
+        else:
+            eve_settings = np.asarray(eve_settings, dtype=np.int64)
+            eve_bits = self.execute(eve_settings, self.e91_eve_circuit) >> 1 & 1
+            codes = self.execute(pair + N_A * N_B * eve_bits, self.e91_resend_circuit)
+            eve_results = eve_bits.astype(bool)
+        return (codes & 1).astype(bool), (codes >> 1 & 1).astype(bool), eve_results
+
+
+class AerPerShotBackend(AerBackend):
+    """One shots=1 Aer job per transmission (the scripts' original behaviour)."""
+    name = 'aer_per_shot'
+
+    def execute(self, signatures, build):
+        out = np.empty(len(signatures), dtype=np.int64)
+        for i, sig in enumerate(signatures):
+            counts = self.simulator.run(build(sig), shots=1).result().get_counts()
+            out[i] = int(list(counts.keys())[0], 2)
+        return out
+
+    def measure_in_basis(self, qc_prep: QuantumCircuit, basis: str) -> int:
+        """
+        Measure the prepared BB84 circuit qc_prep in basis 'Z' or 'X'.
+        Returns measured bit (0 or 1).
+        """
+        qc = measurement_circuit(qc_prep, basis)
+        counts = self.simulator.run(qc, shots=1).result().get_counts()
+        return int(list(counts.keys())[0])
+
+    def measure_bell_pair(self, qc: QuantumCircuit, angle_A: float, angle_B: float):
+        """
+        Measure both qubits in their respective rotated bases simultaneously.
+        Returns (bit_A, bit_B)
+        """
+        qc_r = qc.copy()
+        qc_r.ry(-2*angle_A, 0)
+        qc_r.ry(-2*angle_B, 1)
+        qc_r.measure([0,1], [0,1])
+        counts = self.simulator.run(qc_r, shots=1).result().get_counts()
+        bits = list(counts.keys())[0]
+        # Qiskit counts in little-endian: bits[0] = qubit 1, bits[1] = qubit 0
+        return int(bits[1]), int(bits[0])  # (A,B)
+
+
+class AerBatchedBackend(AerBackend):
+    """Multi-experiment Aer jobs of block_size circuits."""
+    name = 'aer_batched'
+
+    def execute(self, signatures, build):
+        return run_batched((build(sig) for sig in signatures), self.block_size,
+                           self.max_parallel_experiments, sim=self.simulator)
+
+
+class AerPackedBackend(AerBackend):
+    """
+    One packed single-shot circuit per block, run under the stabilizer method
+    when the block is Clifford-only (BB84) and statevector otherwise (E91).
+    """
+    name = 'aer_stabilizer'
+
+    def execute(self, signatures, build):
+        return run_packed((build(sig) for sig in signatures), self.block_size,
+                          max_parallel_experiments=self.max_parallel_experiments,
+                          sim=self.simulator)
+
+
+class AerGroupedBackend(AerBackend):
+    """One Aer job per distinct circuit with shots equal to its group size."""
+    name = 'aer_grouped'
+
+    def execute(self, signatures, build):
+        return run_grouped(signatures, build, sim=self.simulator)
+
+
+class AerParameterizedBackend(AerBatchedBackend):
+    """
+    E91 pairs as parameter bindings of one template circuit per stage
+    (BB84 blocks run as in AerBatchedBackend).
+    """
+    name = 'aer_parameterized'
+
+    def bind_run(self, template: QuantumCircuit, parameters: list, columns: list) -> np.ndarray:
+        return run_parameter_binds(template, parameters, np.column_stack(columns),
+                                   self.block_size, self.max_parallel_experiments,
+                                   sim=self.simulator)
+
+    def e91_block(self, A_settings, B_settings, eve_settings=None):
+        angles_A, angles_B = ANGLES_A[A_settings], ANGLES_B[B_settings]
+        eve_results = None
+        if eve_settings is None:
+            codes = self.bind_run(bell_pair_template(), [theta_A, theta_B], [angles_A, angles_B])
+        elif self.fused_eve:
+            codes = self.bind_run(intercept_template(), [theta_eve, theta_A, theta_B],
+                                  [ANGLES_EVE[eve_settings], angles_A, angles_B])
+            eve_results = (codes >> 2 & 1).astype(bool)
+        else:
+            eve_bits = self.bind_run(eve_template(), [theta_eve], [ANGLES_EVE[eve_settings]]) >> 1 & 1
+            codes = self.bind_run(resend_template(), [theta_A, theta_B, phi_resend],
+                                  [angles_A, angles_B, np.pi * eve_bits])
+            eve_results = eve_bits.astype(bool)
+        return (codes & 1).astype(bool), (codes >> 1 & 1).astype(bool), eve_results
+
+
+class CachedBackend(AerBackend):
+    """
+    Samples every transmission from its circuit's cached exact distribution.
+    The distribution cache needs terminal measurements, so Eve always runs as
+    two stages here (fused_eve is ignored).
+    """
+    name = 'cached'
+
+    def __init__(self, seed=None, max_entries: int = MAX_ENTRIES, **options):
+        super().__init__(seed, **options)
+        self.fused_eve = False
+        self.distributions = DistributionCache(self.noise_model, max_entries)
+
+    def execute(self, signatures, build):
+        return self.distributions.sample_grouped(signatures, build, self.rng)
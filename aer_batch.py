@@ -0,0 +1,199 @@
+"""
+Batched Aer executors: run many one-shot circuits with few simulator jobs.
+
+- run_batched: submits blocks of BLOCK_SIZE circuits as one multi-experiment
+  job each, with Aer's experiment-level parallelism.
+- run_parameter_binds: a single parameterized circuit, bound to a block of
+  parameter rows per job (parameter_binds).
+- run_grouped: each distinct circuit runs once with one shot per transmission
+  that needs it, and the shots are scattered back to those transmissions.
+- run_packed: each block of circuits is packed into one wide or qubit-reusing
+  circuit and run as a single shot (stabilizer method for Clifford-only
+  blocks).
+
+Every executor returns one int64 per circuit (or transmission): the value of
+its classical register, with clbit k as bit k.
+"""
+from itertools import islice
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit_aer import AerSimulator
+
+
+BLOCK_SIZE = 4096                # circuits submitted per Aer job
+MAX_PARALLEL_EXPERIMENTS = 0     # 0 = let Aer use every available core
+PACKED_LAYOUT = 'reuse'          # 'reuse' or 'wide' (see pack_circuits)
+
+simulator = AerSimulator()
+STABILIZER_OPS = set(AerSimulator(method='stabilizer').target.operation_names)
+
+
+def decode_memory(result) -> np.ndarray:
+    """
+    Decode the single-shot memory of every experiment in an Aer result.
+    Returns an int array holding each experiment's classical register value
+    (clbit k is bit k of the value).
+    """
+    return np.fromiter((int(exp.data.memory[0], 16) for exp in result.results),
+                       dtype=np.int64, count=len(result.results))
+
+
+def run_batched(circuits: Iterable[QuantumCircuit],
+                block_size: int = BLOCK_SIZE,
+                max_parallel_experiments: int = MAX_PARALLEL_EXPERIMENTS,
+                sim: Optional[AerSimulator] = None) -> np.ndarray:
+    """
+    Run every circuit once (shots=1) on 'sim' (default: the module simulator),
+    submitting them in blocks of 'block_size' circuits per multi-experiment
+    job. 'circuits' may be a generator, so only one block of circuits is
+    alive at a time.
+    Returns an int array with the classical register value of each circuit.
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be >= 1")
+    sim = simulator if sim is None else sim
+    circuits = iter(circuits)
+    blocks = []
+    while True:
+        block = list(islice(circuits, block_size))
+        if not block:
+            break
+        job = sim.run(block, shots=1, memory=True,
+                      max_parallel_experiments=max_parallel_experiments)
+        blocks.append(decode_memory(job.result()))
+    if not blocks:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(blocks)
+
+
+def run_parameter_binds(circuit: QuantumCircuit, parameters: list,
+                        values: np.ndarray,
+                        block_size: int = BLOCK_SIZE,
+                        max_parallel_experiments: int = MAX_PARALLEL_EXPERIMENTS,
+                        sim: Optional[AerSimulator] = None) -> np.ndarray:
+    """
+    Run the parameterized 'circuit' once (shots=1) for every row of 'values',
+    an array of shape (N, len(parameters)), using Aer's parameter_binds so
+    each block of rows is a single job on a single circuit.
+    Returns an int array with the classical register value of each row.
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be >= 1")
+    sim = simulator if sim is None else sim
+    values = np.asarray(values, dtype=float).reshape(len(values), len(parameters))
+    out = np.empty(len(values), dtype=np.int64)
+    for start in range(0, len(values), block_size):
+        block = values[start:start + block_size]
+        binds = {p: block[:, k].tolist() for k, p in enumerate(parameters)}
+        job = sim.run(circuit, parameter_binds=[binds], shots=1, memory=True,
+                      max_parallel_experiments=max_parallel_experiments)
+        out[start:start + len(block)] = decode_memory(job.result())
+    return out
+
+
+def run_grouped(signatures: np.ndarray,
+                build_circuit: Callable[[np.ndarray], QuantumCircuit],
+                sim: Optional[AerSimulator] = None) -> np.ndarray:
+    """
+    Run each distinct circuit once with shots equal to the number of
+    transmissions that need it, then scatter the per-shot outcomes back.
+    'signatures' has one entry (or row) per transmission; build_circuit(sig)
+    returns the measured circuit for a distinct signature.
+    Returns an int array with one classical register value per transmission.
+    """
+    sim = simulator if sim is None else sim
+    signatures = np.asarray(signatures)
+    out = np.empty(len(signatures), dtype=np.int64)
+    if len(signatures) == 0:
+        return out
+    distinct, inverse, counts = np.unique(signatures, axis=0, return_inverse=True,
+                                          return_counts=True)
+    # transmission indices sorted by group, so each group is a contiguous slice
+    order = np.argsort(inverse.ravel(), kind='stable')
+    start = 0
+    for sig, count in zip(distinct, counts):
+        job = sim.run(build_circuit(sig), shots=int(count), memory=True)
+        memory = job.result().results[0].data.memory
+        out[order[start:start + count]] = np.fromiter((int(m, 16) for m in memory),
+                                                      dtype=np.int64, count=count)
+        start += count
+    return out
+
+
+def choose_method(circuits: list[QuantumCircuit]) -> str:
+    """Return 'stabilizer' if every circuit is Clifford-only, else 'statevector'."""
+    for qc in circuits:
+        if any(inst.operation.name not in STABILIZER_OPS for inst in qc.data):
+            return 'statevector'
+    return 'stabilizer'
+
+
+def pack_circuits(circuits: list[QuantumCircuit], layout: str) -> QuantumCircuit:
+    """
+    Pack independent circuits of equal width into one circuit. Circuit i writes
+    clbits [i*c, (i+1)*c). With layout 'wide' it gets its own qubits
+    [i*k, (i+1)*k); with 'reuse' all circuits share k qubits, reset in between.
+    Reuse keeps the state small (k qubits); wide blocks get expensive quickly,
+    even under the stabilizer method (each measurement is quadratic in width).
+    """
+    k, c = circuits[0].num_qubits, circuits[0].num_clbits
+    if any(qc.num_qubits != k or qc.num_clbits != c for qc in circuits):
+        raise ValueError("packed circuits must all have the same width")
+    if layout not in ('wide', 'reuse'):
+        raise ValueError("layout must be 'wide' or 'reuse'")
+    n = len(circuits)
+    packed = QuantumCircuit(k * n if layout == 'wide' else k, c * n)
+    for i, qc in enumerate(circuits):
+        if layout == 'wide':
+            qubits = packed.qubits[i * k:(i + 1) * k]
+        else:
+            qubits = packed.qubits
+            if i:
+                packed.reset(qubits)
+        # compose remaps control-flow conditions as well as operands
+        packed.compose(qc, qubits=qubits, clbits=packed.clbits[i * c:(i + 1) * c],
+                       inplace=True)
+    return packed
+
+
+def decode_register(memory: str, n: int, c: int) -> np.ndarray:
+    """Split one shot's hex register of n*c clbits into n c-bit values."""
+    raw = int(memory, 16).to_bytes((n * c + 7) // 8, 'little')
+    bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), count=n * c,
+                         bitorder='little').reshape(n, c)
+    return bits.astype(np.int64) @ (1 << np.arange(c, dtype=np.int64))
+
+
+def run_packed(circuits: Iterable[QuantumCircuit],
+               block_size: int = BLOCK_SIZE,
+               method: str = 'auto', layout: str = PACKED_LAYOUT,
+               max_parallel_experiments: int = MAX_PARALLEL_EXPERIMENTS,
+               sim: Optional[AerSimulator] = None) -> np.ndarray:
+    """
+    Run every circuit once by packing each block of 'block_size' circuits into
+    a single one-shot circuit, so the whole block's register comes back at once.
+    method 'auto' picks the stabilizer simulator for Clifford-only blocks and
+    statevector otherwise; it is passed to 'sim' (default: the module
+    simulator, which also carries any noise model) per run.
+    Returns an int array with the classical register value of each circuit.
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be >= 1")
+    sim = simulator if sim is None else sim
+    circuits = iter(circuits)
+    blocks = []
+    while True:
+        block = list(islice(circuits, block_size))
+        if not block:
+            break
+        block_method = choose_method(block) if method == 'auto' else method
+        packed = pack_circuits(block, layout)
+        job = sim.run(packed, shots=1, memory=True, method=block_method,
+                      max_parallel_experiments=max_parallel_experiments)
+        memory = job.result().results[0].data.memory[0]
+        blocks.append(decode_register(memory, len(block), block[0].num_clbits))
+    if not blocks:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(blocks)
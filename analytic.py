@@ -0,0 +1,137 @@
+"""
+Pure-NumPy analytic engines for the QKD simulations (no qiskit import).
+
+Every BB84 transmission is one of the four stabilizer states |0>, |1>, |+>, |->
+measured in Z or X, so each outcome is either deterministic (same basis) or
+a fair coin (different basis). The whole protocol is therefore boolean array
+algebra over all qubits at once.
+
+Bases are encoded as booleans: False = 'Z', True = 'X'.
+
+For E91 the measurement settings are small integer indices into the angle
+tables, and outcomes are sampled from the precomputed joint distribution of
+each setting combination. Joint outcomes are coded like the classical
+register of the circuits: code = bit_A + 2*bit_B (+ 4*bit_Eve).
+"""
+from math import pi
+from typing import Optional
+
+import numpy as np
+
+
+BASIS_LABELS = np.array(['Z', 'X'])
+
+# Ekert's settings (0, 45, 90 / 45, 90, 135 degrees on the Bloch sphere) as
+# polarization angles: outcomes agree with probability cos^2(theta_A - theta_B)
+ANGLES_A = np.array([0, pi/8, pi/4])
+ANGLES_B = np.array([pi/8, pi/4, 3*pi/8])
+ANGLES_EVE = np.array([pi/8, pi/4, 3*pi/8])
+
+
+def random_bits(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Return n uniform random booleans, drawn 8 per random byte."""
+    raw = np.frombuffer(rng.bytes((n + 7) // 8), dtype=np.uint8)
+    return np.unpackbits(raw, count=n).view(bool)
+
+
+def random_bases(rng: np.random.Generator, n: int, bias: float = 0.5) -> np.ndarray:
+    """Return n bases, 'Z' (False) with probability 'bias'."""
+    if bias == 0.5:
+        return random_bits(rng, n)
+    return rng.random(n) >= bias
+
+
+def measure(bits: np.ndarray, prep_bases: np.ndarray, meas_bases: np.ndarray,
+            rng: np.random.Generator) -> np.ndarray:
+    """
+    Measure bits[i] prepared in prep_bases[i] in meas_bases[i] for every i.
+    Matching bases reproduce the bit, mismatched bases give a fair coin.
+    """
+    coins = random_bits(rng, len(bits))
+    return np.where(prep_bases == meas_bases, bits, coins)
+
+
+def bb84_outcomes(A_bits: np.ndarray, A_bases: np.ndarray, B_bases: np.ndarray,
+                  eve_bases: Optional[np.ndarray] = None,
+                  rng: Optional[np.random.Generator] = None):
+    """
+    B's results for given choices, with an intercept-resend Eve measuring in
+    eve_bases when given. Returns (B_results, eve_results or None).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    if eve_bases is None:
+        return measure(A_bits, A_bases, B_bases, rng), None
+    # Eve measures A's qubit, then resends her result in her own basis
+    eve_results = measure(A_bits, A_bases, eve_bases, rng)
+    return measure(eve_results, eve_bases, B_bases, rng), eve_results
+
+
+def bell_pair_table(angles_A: np.ndarray, angles_B: np.ndarray) -> np.ndarray:
+    """
+    Joint outcome distribution of |Phi+> measured along angles_A x angles_B.
+    Returns an array of shape (len(angles_A), len(angles_B), 4) indexed by
+    code = a + 2*b, with P(a=b) = cos^2(theta_A - theta_B) and uniform marginals.
+    """
+    delta = np.subtract.outer(angles_A, angles_B)
+    same = np.cos(delta) ** 2 / 2
+    diff = np.sin(delta) ** 2 / 2
+    return np.stack([same, diff, diff, same], axis=-1)
+
+
+def intercept_table(angles_A: np.ndarray, angles_B: np.ndarray,
+                    angles_eve: np.ndarray) -> np.ndarray:
+    """
+    Joint outcome distribution when Eve intercepts B's qubit of |Phi+>.
+    Eve measures B's qubit along her angle (a fair coin e), then resends a
+    fresh pair |0>|e> in the computational basis, which A and B measure.
+    Returns an array of shape (len(angles_A), len(angles_B), len(angles_eve), 8)
+    indexed by code = a + 2*b + 4*e.
+    """
+    cos_A = np.cos(angles_A) ** 2
+    cos_B = np.cos(angles_B) ** 2
+    p_a = np.stack([cos_A, 1 - cos_A], axis=-1)                 # (A, a)
+    p_b_given_e = np.stack([np.stack([cos_B, 1 - cos_B], axis=-1),
+                            np.stack([1 - cos_B, cos_B], axis=-1)])  # (e, B, b)
+    # P(e) = 1/2 for every Eve angle; index order (A, B, Eve, e, b, a)
+    joint = 0.5 * np.einsum('ia,ejb->ijeba', p_a, p_b_given_e)
+    joint = np.broadcast_to(joint[:, :, None], joint.shape[:2] + (len(angles_eve),) + joint.shape[2:])
+    return joint.reshape(len(angles_A), len(angles_B), len(angles_eve), 8)
+
+
+def sample_codes(table: np.ndarray, settings: np.ndarray,
+                 rng: np.random.Generator) -> np.ndarray:
+    """
+    Draw one outcome code per entry of 'settings' (flat indices into the
+    leading axes of 'table') by inverse-CDF sampling.
+    """
+    cdf = np.cumsum(table.reshape(-1, table.shape[-1]), axis=-1)
+    u = rng.random(len(settings))
+    codes = np.zeros(len(settings), dtype=np.uint8)
+    for j in range(cdf.shape[1] - 1):
+        codes += u >= cdf[settings, j]
+    return codes
+
+
+def random_settings(rng: np.random.Generator, n: int, k: int) -> np.ndarray:
+    """Return n uniform setting indices in range(k)."""
+    return rng.integers(0, k, size=n, dtype=np.uint8)
+
+
+def e91_outcomes(A_settings: np.ndarray, B_settings: np.ndarray,
+                 eve_settings: Optional[np.ndarray] = None,
+                 rng: Optional[np.random.Generator] = None,
+                 angles_A: np.ndarray = ANGLES_A, angles_B: np.ndarray = ANGLES_B,
+                 angles_eve: np.ndarray = ANGLES_EVE):
+    """
+    Sample A's and B's results for given setting indices (and Eve's when
+    eve_settings is given) from the closed-form tables.
+    Returns (results_A, results_B, eve_results or None).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    flat = np.asarray(A_settings, dtype=np.intp) * len(angles_B) + B_settings
+    if eve_settings is None:
+        codes = sample_codes(bell_pair_table(angles_A, angles_B), flat, rng)
+        return (codes & 1).astype(bool), (codes & 2).astype(bool), None
+    flat = flat * len(angles_eve) + eve_settings
+    codes = sample_codes(intercept_table(angles_A, angles_B, angles_eve), flat, rng)
+    return (codes & 1).astype(bool), (codes & 2).astype(bool), (codes & 4).astype(bool)
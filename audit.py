@@ -0,0 +1,120 @@
+"""
+Hybrid audit mode: a fast backend generates every transmission and a random
+fraction of them is re-executed one shot at a time on AerSimulator
+(AerPerShotBackend.measure_in_basis / measure_bell_pair, and the per-shot
+Eve circuits when Eve is present).
+
+Re-execution is an independent sample, not a replay, so audited
+transmissions are compared per setting: the fast and the Aer outcome counts
+of every setting accumulate across blocks and a chi-square homogeneity test
+(validation.homogeneity_test) runs after each block. The run fails with
+AuditError once the p-value drops below alpha.
+"""
+from typing import Optional
+
+import numpy as np
+
+from analytic import ANGLES_A, ANGLES_B, ANGLES_EVE
+from backends import Backend
+from validation import homogeneity_test
+
+
+AUDIT_FRACTION = 0.001
+AUDIT_ALPHA = 1e-4
+
+N_BB84_SETTINGS = 16        # bit + 2*A_basis + 4*B_basis + 8*eve_basis
+N_A, N_B = len(ANGLES_A), len(ANGLES_B)
+N_E91_SETTINGS = N_A * N_B * len(ANGLES_EVE)    # a + N_A*b + N_A*N_B*eve_setting
+
+
+class AuditError(RuntimeError):
+    """The audited subset diverges statistically from the circuit simulator."""
+
+
+class AuditedBackend(Backend):
+    """Wrap a fast backend and spot-check a random fraction on Aer per shot."""
+
+    def __init__(self, fast: Backend, fraction: float = AUDIT_FRACTION,
+                 alpha: float = AUDIT_ALPHA, seed: Optional[int] = None, noise_model=None):
+        super().__init__(seed)
+        # imported here so the fast backend alone never pulls in qiskit
+        from aer_backends import AerPerShotBackend
+        from circuits import prepare_bell_pair, prepare_state
+        self.prepare_state = prepare_state
+        self.bell_pair = prepare_bell_pair()
+        self.fast = fast
+        self.auditor = AerPerShotBackend(seed, noise_model=noise_model)
+        self.fraction = fraction
+        self.alpha = alpha
+        self.name = f'{fast.name}+audit'
+        # counts[setting, outcome] for the fast engine and for Aer
+        self.counts = {'bb84': np.zeros((2, N_BB84_SETTINGS, 4), dtype=np.int64),
+                       'e91': np.zeros((2, N_E91_SETTINGS, 8), dtype=np.int64)}
+        self.audited = 0
+        self.p_value = 1.0
+
+    def pick(self, n: int) -> np.ndarray:
+        """Indices of the transmissions to audit in a block of n."""
+        return np.flatnonzero(self.rng.random(n) < self.fraction)
+
+    def check(self, protocol: str, settings: np.ndarray, fast_out: np.ndarray,
+              aer_out: np.ndarray) -> None:
+        """Accumulate audited outcomes and fail the run on divergence."""
+        counts = self.counts[protocol]
+        np.add.at(counts[0], (settings, fast_out), 1)
+        np.add.at(counts[1], (settings, aer_out), 1)
+        self.audited += len(settings)
+        _, self.p_value = homogeneity_test(*self.counts[protocol])
+        if self.p_value < self.alpha:
+            raise AuditError(f"{protocol} audit failed after {self.audited} transmissions: "
+                             f"{self.fast.name} diverges from Aer (p = {self.p_value:.2g})")
+
+    def bb84_block(self, A_bits, A_bases, B_bases, eve_bases=None):
+        B_results, eve_results = self.fast.bb84_block(A_bits, A_bases, B_bases, eve_bases)
+        idx = self.pick(len(A_bits))
+        if len(idx) == 0:
+            return B_results, eve_results
+        bits = np.asarray(A_bits, dtype=np.int64)[idx]
+        prep = np.asarray(A_bases, dtype=np.int64)[idx]
+        meas = np.asarray(B_bases, dtype=np.int64)[idx]
+        eve = np.zeros_like(bits) if eve_bases is None else np.asarray(eve_bases, dtype=np.int64)[idx]
+        aer_B = np.empty_like(bits)
+        aer_eve = np.zeros_like(bits)
+        for k in range(len(idx)):
+            bit, basis = bits[k], 'ZX'[prep[k]]
+            if eve_bases is not None:
+                # Eve measures and resends her result in her basis
+                aer_eve[k] = self.auditor.measure_in_basis(self.prepare_state(bit, basis), 'ZX'[eve[k]])
+                bit, basis = aer_eve[k], 'ZX'[eve[k]]
+            aer_B[k] = self.auditor.measure_in_basis(self.prepare_state(bit, basis), 'ZX'[meas[k]])
+        fast_out = B_results[idx].astype(np.int64)
+        if eve_results is not None:
+            fast_out += 2 * eve_results[idx]
+        self.check('bb84', bits + 2 * prep + 4 * meas + 8 * eve, fast_out, aer_B + 2 * aer_eve)
+        return B_results, eve_results
+
+    def e91_block(self, A_settings, B_settings, eve_settings=None):
+        results_A, results_B, eve_results = self.fast.e91_block(A_settings, B_settings, eve_settings)
+        idx = self.pick(len(A_settings))
+        if len(idx) == 0:
+            return results_A, results_B, eve_results
+        a = np.asarray(A_settings, dtype=np.int64)[idx]
+        b = np.asarray(B_settings, dtype=np.int64)[idx]
+        if eve_settings is None:
+            e = np.zeros_like(a)
+            pairs = [self.auditor.measure_bell_pair(self.bell_pair, ANGLES_A[i], ANGLES_B[j])
+                     for i, j in zip(a, b)]
+            aer_out = np.array([x + 2 * y for x, y in pairs], dtype=np.int64)
+        else:
+            e = np.asarray(eve_settings, dtype=np.int64)[idx]
+            aer_A, aer_B, aer_eve = self.auditor.e91_block(a, b, e)
+            aer_out = aer_A + 2 * aer_B.astype(np.int64) + 4 * aer_eve
+        fast_out = results_A[idx] + 2 * results_B[idx].astype(np.int64)
+        if eve_results is not None:
+            fast_out += 4 * eve_results[idx]
+        self.check('e91', a + N_A * b + N_A * N_B * e, fast_out, aer_out)
+        return results_A, results_B, eve_results
+
+    def close(self) -> None:
+        self.fast.close()
+        self.auditor.close()
@@ -0,0 +1,83 @@
+"""
+Pluggable simulation backends.
+
+Every backend implements the same block API:
+
+    bb84_block(A_bits, A_bases, B_bases, eve_bases=None) -> (B_results, eve_results)
+    e91_block(A_settings, B_settings, eve_settings=None) -> (results_A, results_B, eve_results)
+
+Bits and results are bool arrays, BB84 bases are bool arrays (True = 'X'),
+and E91 settings are indices into analytic.ANGLES_A / ANGLES_B / ANGLES_EVE.
+eve_* is None when Eve is disabled.
+
+Backends are registered by name and imported only when selected, so choosing
+'numpy' never imports qiskit.
+"""
+import importlib
+from typing import Optional
+
+import numpy as np
+
+from analytic import bb84_outcomes, e91_outcomes
+
+
+BACKENDS = {}         # name -> (module, class name)
+
+
+class Backend:
+    """
+    Base class for simulation backends. Options a backend does not use are
+    ignored, so one configuration can drive every backend.
+    """
+    name = None
+
+    def __init__(self, seed: Optional[int] = None, **options):
+        self.rng = np.random.default_rng(seed)
+        self.options = options
+
+    def bb84_block(self, A_bits: np.ndarray, A_bases: np.ndarray, B_bases: np.ndarray,
+                   eve_bases: Optional[np.ndarray] = None):
+        """Transmit one block of BB84 qubits. Returns (B_results, eve_results or None)."""
+        raise NotImplementedError
+
+    def e91_block(self, A_settings: np.ndarray, B_settings: np.ndarray,
+                  eve_settings: Optional[np.ndarray] = None):
+        """Measure one block of E91 pairs. Returns (results_A, results_B, eve_results or None)."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release resources / persist caches at the end of a run."""
+
+
+class NumPyBackend(Backend):
+    """Pure-NumPy analytic engine (no qiskit)."""
+    name = 'numpy'
+
+    def bb84_block(self, A_bits, A_bases, B_bases, eve_bases=None):
+        return bb84_outcomes(A_bits, A_bases, B_bases, eve_bases, self.rng)
+
+    def e91_block(self, A_settings, B_settings, eve_settings=None):
+        return e91_outcomes(A_settings, B_settings, eve_settings, self.rng)
+
+
+def register_backend(name: str, module: str, class_name: str) -> None:
+    """Register a backend class by module path, to be imported on first use."""
+    BACKENDS[name] = (module, class_name)
+
+
+register_backend('numpy', 'backends', 'NumPyBackend')
+register_backend('aer_per_shot', 'aer_backends', 'AerPerShotBackend')
+register_backend('aer_batched', 'aer_backends', 'AerBatchedBackend')
+register_backend('aer_stabilizer', 'aer_backends', 'AerPackedBackend')
+register_backend('aer_grouped', 'aer_backends', 'AerGroupedBackend')
+register_backend('aer_parameterized', 'aer_backends', 'AerParameterizedBackend')
+register_backend('cached', 'aer_backends', 'CachedBackend')
+
+
+def get_backend(name: str, **options) -> Backend:
+    """Import (lazily) and instantiate the backend registered as 'name'."""
+    try:
+        module, class_name = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown backend {name!r}; choose from {sorted(BACKENDS)}") from None
+    return getattr(importlib.import_module(module), class_name)(**options)
@@ -0,0 +1,73 @@
+"""
+Precompiled circuit library.
+
+BB84 and E91 only ever use a handful of distinct prepare/measure/Eve circuits.
+The library builds and transpiles each one once, memoizes it by signature and
+can persist the compiled set to a QPY file so later processes start warm.
+
+A signature is a tuple of str/int/float values, e.g. ('bb84', 1, 'Z', 'X').
+"""
+import os
+from typing import Callable, Optional
+
+from qiskit import QuantumCircuit, qpy, transpile
+from qiskit.exceptions import QiskitError
+from qiskit_aer import AerSimulator
+
+
+def normalize_signature(signature) -> tuple:
+    """Return 'signature' as a tuple of plain Python scalars (JSON/QPY friendly)."""
+    return tuple(v.item() if hasattr(v, 'item') else v for v in signature)
+
+
+class CircuitLibrary:
+    """Memoized, transpiled circuits keyed by signature, optionally backed by QPY."""
+
+    def __init__(self, path: Optional[str] = None, backend=None):
+        self.path = path
+        self.backend = AerSimulator() if backend is None else backend
+        self.circuits = {}
+        self.dirty = False
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.circuits)
+
+    def __contains__(self, signature) -> bool:
+        return normalize_signature(signature) in self.circuits
+
+    def get(self, signature, build: Callable[[], QuantumCircuit]) -> QuantumCircuit:
+        """
+        Return the compiled circuit for 'signature', calling build() and
+        transpiling the result only the first time it is requested.
+        """
+        key = normalize_signature(signature)
+        qc = self.circuits.get(key)
+        if qc is None:
+            qc = transpile(build(), self.backend)
+            qc.metadata = {'signature': list(key)}
+            self.circuits[key] = qc
+            self.dirty = True
+        return qc
+
+    def load(self, path: str) -> None:
+        """Add every circuit stored in the QPY file at 'path'."""
+        try:
+            with open(path, 'rb') as f:
+                loaded = qpy.load(f)
+        except (QiskitError, ValueError, EOFError):
+            return      # unreadable or stale cache: rebuild on demand
+        for qc in loaded:
+            self.circuits[tuple(qc.metadata['signature'])] = qc
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write the compiled set to 'path' (default: the library's path) as QPY."""
+        path = self.path if path is None else path
+        if path is None:
+            raise ValueError("no QPY path given for the circuit library")
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            qpy.dump(list(self.circuits.values()), f)
+        os.replace(tmp, path)
+        self.dirty = False
@@ -0,0 +1,148 @@
+"""
+Circuit builders for BB84 and E91.
+
+BB84 circuits are single-qubit prepare/measure circuits. E91 circuits are
+parameterized templates over the measurement angles, bound with bind().
+Classical register layout: BB84 measures into clbit 0 (Eve into clbit 0 and
+B into clbit 1 when fused); E91 measures A into clbit 0, B into clbit 1 and
+a fused Eve into clbit 2.
+"""
+from math import pi
+
+from qiskit import QuantumCircuit
+from qiskit.circuit import Parameter
+
+
+theta_A = Parameter('theta_A')
+theta_B = Parameter('theta_B')
+theta_eve = Parameter('theta_eve')
+phi_resend = Parameter('phi_resend')
+
+
+# -----------------------------
+# BB84
+# -----------------------------
+def prepare_state(bit: int, basis: str) -> QuantumCircuit:
+    """Return a QuantumCircuit(1,1) preparing 'bit' in basis 'Z' or 'X'."""
+    qc = QuantumCircuit(1, 1)
+    if basis == 'Z':
+        if bit == 1:
+            qc.x(0)
+    elif basis == 'X':
+        if bit == 0:
+            qc.h(0)         # |+>
+        else:
+            qc.x(0)
+            qc.h(0)         # |->
+    else:
+        raise ValueError("basis must be 'Z' or 'X'")
+    return qc
+
+def measurement_circuit(qc_prep: QuantumCircuit, basis: str) -> QuantumCircuit:
+    """Return a copy of qc_prep followed by a measurement in basis 'Z' or 'X'."""
+    qc = qc_prep.copy()
+    if basis == 'X':
+        qc.h(0)
+    qc.measure(0, 0)
+    return qc
+
+def intercept_resend_circuit(bit: int, prep_basis: str, eve_basis: str,
+                             meas_basis: str) -> QuantumCircuit:
+    """
+    Return a QuantumCircuit(1,2) for one intercepted transmission: A prepares
+    'bit' in prep_basis, Eve measures in eve_basis into clbit 0, resets the
+    qubit and re-prepares her outcome (conditioned on clbit 0) in eve_basis,
+    then B measures in meas_basis into clbit 1.
+    """
+    qc = QuantumCircuit(1, 2)
+    qc.compose(prepare_state(bit, prep_basis), clbits=[0], inplace=True)
+    if eve_basis == 'X':
+        qc.h(0)
+    qc.measure(0, 0)
+    qc.reset(0)
+    with qc.if_test((qc.clbits[0], 1)):
+        qc.x(0)
+    if eve_basis == 'X':
+        qc.h(0)
+    if meas_basis == 'X':
+        qc.h(0)
+    qc.measure(0, 1)
+    return qc
+
+
+# -----------------------------
+# E91
+# -----------------------------
+def prepare_bell_pair() -> QuantumCircuit:
+    """Prepare a Bell state |Φ+>"""
+    qc = QuantumCircuit(2, 2)
+    qc.h(0)
+    qc.cx(0, 1)
+    return qc
+
+def bell_pair_template() -> QuantumCircuit:
+    """Bell pair measured along the parameterized angles theta_A, theta_B."""
+    qc = prepare_bell_pair()
+    qc.ry(-2*theta_A, 0)
+    qc.ry(-2*theta_B, 1)
+    qc.measure([0,1], [0,1])
+    return qc
+
+def eve_template() -> QuantumCircuit:
+    """Bell pair with only B's qubit measured along the parameterized theta_eve."""
+    qc = prepare_bell_pair()
+    qc.ry(-2*theta_eve, 1)
+    qc.measure(1, 1)
+    return qc
+
+def resend_template() -> QuantumCircuit:
+    """
+    Eve's resent pair |0>|e> (phi_resend = pi*e) measured along theta_A, theta_B.
+    """
+    qc = QuantumCircuit(2, 2)
+    qc.ry(phi_resend, 1)
+    qc.ry(-2*theta_A, 0)
+    qc.ry(-2*theta_B, 1)
+    qc.measure([0,1], [0,1])
+    return qc
+
+def intercept_template() -> QuantumCircuit:
+    """
+    Parameterized QuantumCircuit(2,3) for one intercepted pair: Eve measures
+    B's qubit along theta_eve into clbit 2, both qubits are reset and Eve
+    resends |0>|e> (conditioned on clbit 2), then A and B measure along
+    theta_A, theta_B into clbits 0 and 1.
+    """
+    qc = QuantumCircuit(2, 3)
+    qc.compose(prepare_bell_pair(), clbits=[0, 1], inplace=True)
+    qc.ry(-2*theta_eve, 1)
+    qc.measure(1, 2)
+    qc.reset([0, 1])
+    with qc.if_test((qc.clbits[2], 1)):
+        qc.x(1)
+    qc.ry(-2*theta_A, 0)
+    qc.ry(-2*theta_B, 1)
+    qc.measure([0,1], [0,1])
+    return qc
+
+def bind(template: QuantumCircuit, parameters: list, values) -> QuantumCircuit:
+    """Return 'template' with 'parameters' bound to 'values'."""
+    return template.assign_parameters(dict(zip(parameters, values)))
+
+def bell_pair_circuit(angle_A: float, angle_B: float) -> QuantumCircuit:
+    """Bell pair measured along angle_A, angle_B."""
+    return bind(bell_pair_template(), [theta_A, theta_B], [angle_A, angle_B])
+
+def eve_circuit(angle_eve: float) -> QuantumCircuit:
+    """Eve measures B's qubit of a Bell pair along angle_eve (into clbit 1)."""
+    return bind(eve_template(), [theta_eve], [angle_eve])
+
+def resend_circuit(eve_meas: int, angle_A: float, angle_B: float) -> QuantumCircuit:
+    """Eve's resent pair |0>|eve_meas> measured along angle_A, angle_B."""
+    return bind(resend_template(), [theta_A, theta_B, phi_resend],
+                [angle_A, angle_B, pi * eve_meas])
+
+def intercept_circuit(angle_eve: float, angle_A: float, angle_B: float) -> QuantumCircuit:
+    """Fused intercept-resend pair (see intercept_template)."""
+    return bind(intercept_template(), [theta_eve, theta_A, theta_B],
+                [angle_eve, angle_A, angle_B])
@@ -0,0 +1,158 @@
+"""
+Outcome-distribution cache.
+
+BB84 and E91 reuse a tiny set of circuits, so instead of running Aer once per
+shot the exact classical outcome distribution of each circuit is computed
+once (statevector when noiseless, density matrix when a noise model is
+attached) and every later transmission is drawn from it with NumPy.
+
+Entries are keyed by (circuit signature, noise model hash) and bounded LRU.
+Gate errors and readout errors of the noise model are modelled; quantum
+errors attached to the 'measure' instruction itself are not.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.quantum_info import Statevector
+from qiskit_aer import AerSimulator
+
+from circuit_library import normalize_signature
+
+
+MAX_ENTRIES = 256
+
+
+def noise_model_hash(noise_model) -> Optional[str]:
+    """Return a stable hash of 'noise_model' (None when noiseless)."""
+    if noise_model is None:
+        return None
+    errors = [{k: v for k, v in err.items() if k != 'id'}
+              for err in noise_model.to_dict(serializable=True)['errors']]
+    return hashlib.sha256(json.dumps(errors, sort_keys=True).encode()).hexdigest()
+
+
+def split_final_measurements(qc: QuantumCircuit) -> tuple[QuantumCircuit, list]:
+    """
+    Remove the terminal measurements of 'qc'.
+    Returns (circuit without them, [(qubit index, clbit index), ...]).
+    """
+    stripped = qc.copy_empty_like()
+    measured = []
+    for inst in qc.data:
+        if inst.operation.name == 'measure':
+            measured.append((qc.find_bit(inst.qubits[0]).index,
+                             qc.find_bit(inst.clbits[0]).index))
+        elif any(qc.find_bit(q).index in {m for m, _ in measured} for q in inst.qubits):
+            raise ValueError("only terminal measurements are supported")
+        else:
+            stripped.append(inst)
+    return stripped, measured
+
+
+def readout_matrices(noise_model, num_qubits: int) -> list:
+    """Per-qubit 2x2 readout confusion matrices P(read | true) (None = ideal)."""
+    matrices = [None] * num_qubits
+    if noise_model is None:
+        return matrices
+    errors = noise_model.to_dict(serializable=True)['errors']
+    for err in errors:
+        if err['type'] == 'roerror' and 'gate_qubits' not in err:
+            matrices = [np.array(err['probabilities'])] * num_qubits
+    for err in errors:
+        if err['type'] == 'roerror' and 'gate_qubits' in err:
+            for (q,) in err['gate_qubits']:
+                if q < num_qubits:
+                    matrices[q] = np.array(err['probabilities'])
+    return matrices
+
+
+class DistributionCache:
+    """LRU cache of exact classical outcome distributions, one per circuit."""
+
+    def __init__(self, noise_model=None, max_entries: int = MAX_ENTRIES):
+        self.noise_model = noise_model
+        self.noise_hash = noise_model_hash(noise_model)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.simulator = (None if noise_model is None else
+                          AerSimulator(method='density_matrix', noise_model=noise_model))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def probabilities(self, signature, build: Callable[[], QuantumCircuit]) -> np.ndarray:
+        """
+        Return P(code) for the circuit with this signature, where code is the
+        classical register value. build() is only called on a cache miss.
+        """
+        key = (normalize_signature(signature), self.noise_hash)
+        probs = self.entries.get(key)
+        if probs is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return probs
+        self.misses += 1
+        probs = self.compute(build())
+        self.entries[key] = probs
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return probs
+
+    def compute(self, qc: QuantumCircuit) -> np.ndarray:
+        """Exact distribution over the classical register of 'qc'."""
+        stripped, measured = split_final_measurements(qc)
+        qubits = [q for q, _ in measured]
+        if self.simulator is None:
+            qubit_probs = Statevector(stripped).probabilities(qubits)
+        else:
+            stripped.save_density_matrix()
+            rho = self.simulator.run(stripped).result().data()['density_matrix']
+            qubit_probs = rho.probabilities(qubits)
+        # axis k of the tensor is qubits[k] (probabilities() is little-endian)
+        m = len(qubits)
+        tensor = qubit_probs.reshape((2,) * m).transpose(range(m - 1, -1, -1))
+        matrices = readout_matrices(self.noise_model, qc.num_qubits)
+        for axis, q in enumerate(qubits):
+            if matrices[q] is not None:
+                tensor = np.moveaxis(np.tensordot(tensor, matrices[q], axes=([axis], [0])),
+                                     -1, axis)
+        codes = sum(np.indices((2,) * m)[k] << c for k, (_, c) in enumerate(measured))
+        probs = np.zeros(2 ** qc.num_clbits)
+        np.add.at(probs, np.ravel(codes), tensor.ravel())
+        return probs / probs.sum()
+
+    def sample(self, signature, build: Callable[[], QuantumCircuit], n: int,
+               rng: np.random.Generator) -> np.ndarray:
+        """Draw n classical register values for the circuit with this signature."""
+        probs = self.probabilities(signature, build)
+        return rng.choice(len(probs), size=n, p=probs)
+
+    def sample_grouped(self, signatures: np.ndarray,
+                       build_circuit: Callable[[np.ndarray], QuantumCircuit],
+                       rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        Drop-in for aer_batch.run_grouped: one classical register value per
+        transmission, drawn from each distinct circuit's cached distribution.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        signatures = np.asarray(signatures)
+        out = np.empty(len(signatures), dtype=np.int64)
+        if len(signatures) == 0:
+            return out
+        distinct, inverse, counts = np.unique(signatures, axis=0, return_inverse=True,
+                                              return_counts=True)
+        order = np.argsort(inverse.ravel(), kind='stable')
+        start = 0
+        for sig, count in zip(distinct, counts):
+            qc = build_circuit(sig)
+            # library circuits carry their signature; fall back to the group key
+            key = qc.metadata.get('signature') or np.atleast_1d(sig)
+            out[order[start:start + count]] = self.sample(key, lambda: qc, count, rng)
+            start += count
+        return out
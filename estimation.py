@@ -0,0 +1,170 @@
+"""
+Parameter estimation stage: reveal a random sample of the sifted key,
+estimate the QBER from it and strip it from the raw key.
+
+The sample is also split by basis: Z-basis sample errors estimate the bit
+error rate, and X-basis sample errors estimate the phase error rate of the Z
+key bits. Each rate comes with a Clopper-Pearson confidence interval.
+pauli_channel() adds the transmissions discarded at sifting (A and B in
+different bases), which reveal no key bits. Together with the per-basis
+rates they give the channel's correlation matrix in the x-z plane. Its
+rotation (a reference-frame misalignment) and the Pauli channel in the
+aligned frame follow from it.
+
+Every step is a packed word operation over the whole key (sample mask
+scatter, popcount of errors & sample, mask compression), so the stage is
+linear in the sifted key length (tests/test_estimation.py checks the
+scaling).
+"""
+from math import atan2
+from typing import NamedTuple, Optional
+
+import numpy as np
+from scipy import stats
+
+from keybuffer import KeyBuffer
+
+
+CONFIDENCE = 0.95
+
+
+class ParameterEstimate(NamedTuple):
+    sample_size: int
+    mismatches: int
+    qber: float
+    sample_mask: KeyBuffer        # revealed positions of the sifted key
+    raw_A_key: KeyBuffer          # sifted keys without the revealed sample
+    raw_B_key: KeyBuffer
+
+
+def sample_mask(n: int, sample_size: int, rng: np.random.Generator) -> KeyBuffer:
+    """Packed mask with exactly sample_size of n positions set, chosen uniformly."""
+    mask = KeyBuffer(n)
+    mask.scatter(rng.choice(n, sample_size, replace=False), True)
+    return mask
+
+
+def estimate_parameters(sifted_A: KeyBuffer, sifted_B: KeyBuffer, sample_fraction: float,
+                        rng: Optional[np.random.Generator] = None) -> ParameterEstimate:
+    """
+    Reveal max(1, sample_fraction * len) random sifted bits, count their
+    mismatches and remove them from both keys.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    sift_len = len(sifted_A)
+    if sift_len == 0:
+        raise ValueError("cannot estimate parameters of an empty sifted key")
+    sample_size = max(1, int(sample_fraction * sift_len))
+    return estimate_from_sample(sifted_A, sifted_B, sample_mask(sift_len, sample_size, rng))
+
+
+def estimate_from_sample(sifted_A: KeyBuffer, sifted_B: KeyBuffer,
+                         sample: KeyBuffer) -> ParameterEstimate:
+    """Estimate from an already chosen (e.g. revealed online) non-empty sample mask."""
+    sample_size = sample.weight()
+    if sample_size == 0:
+        raise ValueError("the sample mask is empty")
+    mismatches = ((sifted_A ^ sifted_B) & sample).weight()
+    keep = ~sample
+    return ParameterEstimate(sample_size, mismatches, mismatches / sample_size, sample,
+                             sifted_A.compress(keep), sifted_B.compress(keep))
+
+
+# -----------------------------
+# per-basis rates and channel tomography
+# -----------------------------
+class RateEstimate(NamedTuple):
+    trials: int
+    errors: int
+    rate: float
+    low: float              # Clopper-Pearson interval
+    high: float
+
+
+def clopper_pearson(errors, trials, confidence: float = CONFIDENCE):
+    """Two-sided exact binomial interval(s) (low, high); (0, 1) where trials == 0."""
+    errors, trials = np.asarray(errors, dtype=float), np.asarray(trials, dtype=float)
+    tail = (1 - confidence) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low = np.where(errors > 0, stats.beta.ppf(tail, errors, trials - errors + 1), 0.0)
+        high = np.where(errors < trials, stats.beta.ppf(1 - tail, errors + 1, trials - errors), 1.0)
+    return np.nan_to_num(low, nan=0.0), np.nan_to_num(high, nan=1.0)
+
+
+def rate_estimate(errors: int, trials: int, confidence: float = CONFIDENCE) -> RateEstimate:
+    low, high = clopper_pearson(errors, trials, confidence)
+    return RateEstimate(trials, errors, errors / trials if trials else float('nan'),
+                        float(low), float(high))
+
+
+class BasisEstimates(NamedTuple):
+    Z: RateEstimate         # Z-basis sample: bit errors
+    X: RateEstimate         # X-basis sample: phase errors of the Z key bits
+
+
+def per_basis_estimates(sifted_A: KeyBuffer, sifted_B: KeyBuffer, sifted_basis: KeyBuffer,
+                        sample: KeyBuffer, confidence: float = CONFIDENCE) -> BasisEstimates:
+    """Split the sample errors by basis (sifted_basis: 1 = X) with word operations."""
+    mismatch = (sifted_A ^ sifted_B) & sample
+    k_X = (sample & sifted_basis).weight()
+    e_X = (mismatch & sifted_basis).weight()
+    k_Z, e_Z = sample.weight() - k_X, mismatch.weight() - e_X
+    return BasisEstimates(rate_estimate(e_Z, k_Z, confidence), rate_estimate(e_X, k_X, confidence))
+
+
+class PauliChannel(NamedTuple):
+    correlations: np.ndarray    # 2x2 R[b, a] = E[(-1)^(A bit + B result)], 0 = Z, 1 = X
+    low: np.ndarray             # confidence interval of every entry
+    high: np.ndarray
+    rotation: float             # x-z frame rotation (radians), 0 unless significant
+    eigenvalues: np.ndarray     # (lambda_z, lambda_x) in the aligned frame
+    probabilities: np.ndarray   # (p_I, p_X, p_Y, p_Z), p_Y chosen to maximize the entropy
+    p_Y_range: tuple            # p_Y values allowed by complete positivity
+
+
+def pauli_channel(basis: BasisEstimates, total: np.ndarray, agree: np.ndarray,
+                  confidence: float = CONFIDENCE) -> PauliChannel:
+    """
+    Fit the qubit channel from the per-basis sample rates (diagonal of R)
+    and the discarded-basis counts (off-diagonal; see
+    transmissions.bb84_mismatched_counts). BB84 never measures Y, so lambda_y
+    (and p_Y) is only known to lie in the completely positive range.
+    The reported p_Y maximizes the entropy of the Pauli distribution (the
+    worst case for secrecy). The frame is rotated (SVD of R) only when an
+    off-diagonal confidence interval excludes 0. Otherwise off-diagonal
+    sampling noise would show up as a rotation and as spurious Pauli errors,
+    so the diagonal of R is used as is.
+    """
+    trials = total.astype(float).copy()
+    errors = (total - agree).astype(float)
+    for i, est in enumerate((basis.Z, basis.X)):
+        trials[i, i], errors[i, i] = est.trials, est.errors
+    with np.errstate(divide='ignore', invalid='ignore'):
+        R = np.where(trials > 0, 1 - 2 * errors / trials, 0.0)
+    p_low, p_high = clopper_pearson(errors, trials, confidence)
+    low, high = 1 - 2 * p_high, 1 - 2 * p_low
+
+    off_diagonal = ~np.eye(2, dtype=bool)
+    if ((low > 0) | (high < 0))[off_diagonal].any():
+        # R = rotation @ diag(lambda) @ V^T; keep a proper rotation by signing lambda
+        U, s, Vt = np.linalg.svd(R)
+        if np.linalg.det(U @ Vt) < 0:
+            U[:, 1], s[1] = -U[:, 1], -s[1]
+        M = U @ Vt
+        rotation = atan2(M[1, 0], M[0, 0])
+    else:
+        s, rotation = np.diag(R), 0.0
+    lam_z, lam_x = np.clip(s, -1, 1)   # sampling noise can push |lambda| past 1
+
+    lam_y_lo = max(-1 - lam_x - lam_z, lam_x + lam_z - 1)
+    lam_y_hi = min(1 + lam_x - lam_z, 1 - lam_x + lam_z)
+    lam_y = np.clip(np.linspace(lam_y_lo, lam_y_hi, 201), -1, 1)
+    p = np.stack([1 + lam_x + lam_y + lam_z, 1 + lam_x - lam_y - lam_z,
+                  1 - lam_x + lam_y - lam_z, 1 - lam_x - lam_y + lam_z]) / 4
+    p = np.clip(p, 0, 1)
+    p /= p.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=0)
+    probabilities = p[:, np.argmax(entropy)]
+    return PauliChannel(R, low, high, rotation, np.array([lam_z, lam_x]), probabilities,
+                        (float(p[2].min()), float(p[2].max())))
@@ -0,0 +1,256 @@
+"""
+Finite-key secure key length for BB84-type protocols.
+
+After sifting, k sample bits are revealed and show e errors, and the
+remaining n bits are reconciled (leaking leak_EC bits) and hashed. Following
+Tomamichel, Lim, Gisin and Renner (Nat. Commun. 3, 634, 2012), an
+eps_sec-secret and eps_cor-correct key of length
+
+    l = n (1 - h(Q + mu)) - leak_EC - log2(2 / (eps_sec^2 eps_cor))
+
+can be extracted. Q = e / k, and Q + mu bounds the phase-error rate of the n
+key bits except with probability ~eps_sec. The last term pays for the
+leftover hash lemma (2 log2(1/eps_sec)) and the verification hash
+(log2(1/eps_cor)). mu comes from one of two sampling bounds:
+
+- 'serfling': sqrt((n + k) / (n k) * (k + 1) / k * ln(2 / eps_sec)), a
+  bound for sampling without replacement (Tomamichel et al.)
+- 'hoeffding': (n + k) / n * sqrt(ln(1 / eps_sec) / (2 k)), Hoeffding's
+  bound on the sample, carried over to the unrevealed bits
+
+All functions broadcast over numpy arrays, so one call evaluates whole grids
+of (N, SAMPLE_FRACTION, QBER), as key_length_grid() does.
+
+With biased basis choice (Z with probability p), the Z and X key bits are
+bounded separately, each from the other basis' sample (two_basis_key_length).
+optimize_parameters() picks the sample fraction and bias that maximize the
+expected secure bits per signal with scipy.optimize. parameter_table()
+precomputes them over a (log N, QBER) grid and caches them on disk, so
+lookup_parameters() costs microseconds per session.
+"""
+import os
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+from scipy import optimize
+
+
+EPS_SEC = 1e-10            # secrecy parameter
+EPS_COR = 1e-15            # correctness parameter
+EC_EFFICIENCY = 1.16       # leak_EC / (n h(Q)) assumed when the leak is not known
+DEFAULT_SAMPLE_FRACTION = 0.25     # used when no sample fraction yields a key
+SAMPLE_FRACTION_BOUNDS = (1e-4, 0.9)
+BIAS_BOUNDS = (0.5, 0.99)          # probability of the Z basis
+TABLE_N = np.logspace(3, 10, 29)   # signals per session in the lookup table
+TABLE_QBER = np.linspace(0, 0.11, 23)
+PARAMETER_CACHE_DIR = '.finite_key_cache'
+
+
+def entropy(p) -> np.ndarray:
+    """Binary entropy h(p) elementwise; 0 outside (0, 1) and 1 from 0.5 up."""
+    p = np.clip(np.asarray(p, dtype=float), 0.0, 0.5)
+    q = np.where((p > 0) & (p < 1), p, 0.5)         # placeholder where h is 0
+    h = -q * np.log2(q) - (1 - q) * np.log2(1 - q)
+    return np.where(p > 0, h, 0.0)
+
+
+def phase_error_bound(n, k, errors, eps_sec: float = EPS_SEC,
+                      method: str = 'serfling') -> np.ndarray:
+    """Upper bound Q + mu on the phase-error rate of n key bits given errors in k samples."""
+    n, k = np.asarray(n, dtype=float), np.asarray(k, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'serfling':
+            mu = np.sqrt((n + k) / (n * k) * (k + 1) / k * np.log(2 / eps_sec))
+        elif method == 'hoeffding':
+            mu = (n + k) / n * np.sqrt(np.log(1 / eps_sec) / (2 * k))
+        else:
+            raise ValueError("method must be 'serfling' or 'hoeffding'")
+        bound = np.asarray(errors, dtype=float) / k + mu
+    return np.where((n > 0) & (k > 0), bound, np.inf)
+
+
+def _key_length(n, k, errors, leaked, eps_sec: float, eps_cor: float, method: str) -> np.ndarray:
+    """Unrounded (possibly negative) finite-key length; leaked=None as in secure_key_length."""
+    n = np.asarray(n, dtype=float)
+    k = np.asarray(k, dtype=float)
+    if leaked is None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            qber = np.where(k > 0, np.asarray(errors, dtype=float) / k, 0.5)
+        leaked = EC_EFFICIENCY * n * entropy(qber)
+    bound = phase_error_bound(n, k, errors, eps_sec, method)
+    return (n * (1 - entropy(bound)) - np.asarray(leaked, dtype=float)
+            - np.log2(2 / (eps_sec ** 2 * eps_cor)))
+
+
+def secure_key_length(n, k, errors, leaked=None, eps_sec: float = EPS_SEC,
+                      eps_cor: float = EPS_COR, method: str = 'serfling') -> np.ndarray:
+    """
+    Extractable key bits (int64, clipped at 0) from n reconciled key bits,
+    k sample bits with 'errors' mismatches and 'leaked' reconciliation bits.
+    leaked=None assumes EC_EFFICIENCY * n * h(errors / k).
+    """
+    length = _key_length(n, k, errors, leaked, eps_sec, eps_cor, method)
+    return np.maximum(np.floor(length), 0).astype(np.int64)
+
+
+def _two_basis_length(n_Z, n_X, k_Z, k_X, e_Z, e_X, leaked, eps_sec: float,
+                      eps_cor: float, method: str) -> np.ndarray:
+    """Unrounded two-basis finite-key length; arguments as in two_basis_key_length."""
+    n_Z, n_X = np.asarray(n_Z, dtype=float), np.asarray(n_X, dtype=float)
+    if leaked is None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            q_Z = np.where(np.asarray(k_Z) > 0, np.asarray(e_Z, dtype=float) / k_Z, 0.5)
+            q_X = np.where(np.asarray(k_X) > 0, np.asarray(e_X, dtype=float) / k_X, 0.5)
+        leaked = EC_EFFICIENCY * (n_Z * entropy(q_Z) + n_X * entropy(q_X))
+    # phase errors of Z key bits show up as bit errors in the X basis and vice versa;
+    # each estimate fails with probability eps_sec / 2
+    phase_Z = phase_error_bound(n_Z, k_X, e_X, eps_sec / 2, method)
+    phase_X = phase_error_bound(n_X, k_Z, e_Z, eps_sec / 2, method)
+    entropy_bits = (np.where(n_Z > 0, n_Z * (1 - entropy(phase_Z)), 0.0) +
+                    np.where(n_X > 0, n_X * (1 - entropy(phase_X)), 0.0))
+    return entropy_bits - np.asarray(leaked, dtype=float) - np.log2(2 / (eps_sec ** 2 * eps_cor))
+
+
+def two_basis_key_length(n_Z, n_X, k_Z, k_X, e_Z, e_X, leaked=None, eps_sec: float = EPS_SEC,
+                         eps_cor: float = EPS_COR, method: str = 'serfling') -> np.ndarray:
+    """
+    Finite-key length (int64, clipped at 0) when the bases are chosen with a
+    bias: n_b key bits, k_b sample bits and e_b sample errors per basis b.
+    Phase errors of the Z key bits are bounded from the X sample and vice
+    versa. leaked=None assumes EC_EFFICIENCY * sum_b n_b h(e_b / k_b).
+    """
+    length = _two_basis_length(n_Z, n_X, k_Z, k_X, e_Z, e_X, leaked, eps_sec, eps_cor, method)
+    return np.maximum(np.floor(length), 0).astype(np.int64)
+
+
+def key_length_grid(N, sample_fraction, qber, sift_ratio: float = 0.5,
+                    eps_sec: float = EPS_SEC, eps_cor: float = EPS_COR,
+                    method: str = 'serfling', leaked_fraction: Optional[float] = None) -> np.ndarray:
+    """
+    Expected secure length for every combination of sent signals N, sample
+    fraction and QBER: an array of shape (len(N), len(sample_fraction),
+    len(qber)). The sifted length is sift_ratio * N (1/2 for BB84, 2/9 for
+    E91), and the sample shows qber * k errors. leaked_fraction is leak_EC / n
+    (None: EC_EFFICIENCY * h(qber)).
+    """
+    N, f, q = np.ix_(np.atleast_1d(np.asarray(N, dtype=float)),
+                     np.atleast_1d(np.asarray(sample_fraction, dtype=float)),
+                     np.atleast_1d(np.asarray(qber, dtype=float)))
+    sifted = np.floor(sift_ratio * N)
+    k = np.maximum(np.floor(f * sifted), 1)
+    n = sifted - k
+    leaked = None if leaked_fraction is None else leaked_fraction * n
+    return secure_key_length(n, k, q * k, leaked, eps_sec, eps_cor, method)
+
+
+# -----------------------------
+# session parameter optimization
+# -----------------------------
+class SessionParameters(NamedTuple):
+    sample_fraction: float
+    bias: float             # probability of the Z basis (0.5 = unbiased)
+    rate: float             # expected secure bits per transmitted signal
+
+
+def _expected_length(N, sample_fraction, qber, bias, sift_ratio: float, eps_sec: float,
+                     eps_cor: float, method: str) -> np.ndarray:
+    """Unrounded expected length; bias None uses the single-sample bound of secure_key_length."""
+    N, f, q = (np.asarray(a, dtype=float) for a in (N, sample_fraction, qber))
+    if bias is None:
+        sifted = sift_ratio * N
+        k = f * sifted
+        return _key_length(sifted - k, k, q * k, None, eps_sec, eps_cor, method)
+    p = np.asarray(bias, dtype=float)
+    sifted_Z, sifted_X = N * p * p, N * (1 - p) * (1 - p)
+    k_Z, k_X = f * sifted_Z, f * sifted_X
+    return _two_basis_length(sifted_Z - k_Z, sifted_X - k_X, k_Z, k_X, q * k_Z, q * k_X,
+                             None, eps_sec, eps_cor, method)
+
+
+def expected_key_rate(N, sample_fraction, qber, bias=None, sift_ratio: float = 0.5,
+                      eps_sec: float = EPS_SEC, eps_cor: float = EPS_COR,
+                      method: str = 'serfling') -> np.ndarray:
+    """
+    Expected secure bits per transmitted signal (broadcasting over all array
+    arguments). With bias = P(Z basis), BB84 sifts N p^2 Z and N (1-p)^2 X
+    bits and two_basis_key_length applies. bias=None sifts sift_ratio * N
+    bits and secure_key_length applies.
+    """
+    length = _expected_length(N, sample_fraction, qber, bias, sift_ratio, eps_sec, eps_cor, method)
+    return np.maximum(length, 0) / np.asarray(N, dtype=float)
+
+
+def optimize_parameters(N: float, qber: float, sift_ratio: float = 0.5, optimize_bias: bool = True,
+                        eps_sec: float = EPS_SEC, eps_cor: float = EPS_COR,
+                        method: str = 'serfling') -> SessionParameters:
+    """
+    Sample fraction (and, with optimize_bias, the Z-basis bias) maximizing
+    the expected secure bits per signal. A vectorized coarse grid seeds
+    L-BFGS-B over (log10 fraction, bias). When no choice gives a positive
+    length, DEFAULT_SAMPLE_FRACTION and an unbiased basis choice are returned.
+    """
+    def length(log_f, p):
+        return _expected_length(N, 10.0 ** log_f, qber, p if optimize_bias else None,
+                                sift_ratio, eps_sec, eps_cor, method)
+
+    log_f = np.linspace(*np.log10(SAMPLE_FRACTION_BOUNDS), 61)
+    bias = np.linspace(*BIAS_BOUNDS, 50) if optimize_bias else np.array([0.5])
+    grid = length(log_f[:, None], bias[None, :])
+    i, j = np.unravel_index(np.argmax(grid), grid.shape)
+    result = optimize.minimize(lambda v: -float(length(v[0], v[1])), [log_f[i], bias[j]],
+                               method='L-BFGS-B',
+                               bounds=[tuple(np.log10(SAMPLE_FRACTION_BOUNDS)),
+                                       BIAS_BOUNDS if optimize_bias else (0.5, 0.5)])
+    best, (best_log_f, best_p) = -result.fun, result.x
+    if grid[i, j] > best:           # keep the grid point if the local search went astray
+        best, best_log_f, best_p = grid[i, j], log_f[i], bias[j]
+    if best <= 0:
+        return SessionParameters(DEFAULT_SAMPLE_FRACTION, 0.5, 0.0)
+    return SessionParameters(float(10.0 ** best_log_f), float(best_p), float(best / N))
+
+
+@lru_cache(maxsize=8)
+def parameter_table(sift_ratio: float = 0.5, optimize_bias: bool = True,
+                    eps_sec: float = EPS_SEC, eps_cor: float = EPS_COR, method: str = 'serfling',
+                    cache_dir: Optional[str] = PARAMETER_CACHE_DIR):
+    """
+    Optimal (sample_fraction, bias, rate) arrays over TABLE_N x TABLE_QBER,
+    loaded from / saved to cache_dir. The arrays are read-only.
+    """
+    name = f'params_{sift_ratio:.4f}_{int(optimize_bias)}_{eps_sec:g}_{eps_cor:g}_{method}.npz'
+    path = None if cache_dir is None else os.path.join(cache_dir, name)
+    table = None
+    if path is not None and os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                table = data['sample_fraction'], data['bias'], data['rate']
+        except (OSError, ValueError, KeyError):
+            pass            # unreadable cache entry: rebuild it
+    if table is None or table[0].shape != (len(TABLE_N), len(TABLE_QBER)):
+        table = np.array([[optimize_parameters(N, q, sift_ratio, optimize_bias, eps_sec, eps_cor, method)
+                           for q in TABLE_QBER] for N in TABLE_N]).transpose(2, 0, 1)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = path + '.tmp.npz'
+            np.savez(tmp, sample_fraction=table[0], bias=table[1], rate=table[2])
+            os.replace(tmp, path)
+    for a in table:
+        a.flags.writeable = False
+    return tuple(table)
+
+
+def lookup_parameters(N: float, qber: float, sift_ratio: float = 0.5, optimize_bias: bool = True,
+                      eps_sec: float = EPS_SEC, eps_cor: float = EPS_COR, method: str = 'serfling',
+                      cache_dir: Optional[str] = PARAMETER_CACHE_DIR) -> SessionParameters:
+    """
+    Session parameters for N signals at an expected QBER, bilinearly
+    interpolated in (log10 N, QBER) from parameter_table() (clamped to its range).
+    """
+    table = parameter_table(sift_ratio, optimize_bias, eps_sec, eps_cor, method, cache_dir)
+    x = np.interp(np.log10(max(N, 1)), np.log10(TABLE_N), np.arange(len(TABLE_N)))
+    y = np.interp(qber, TABLE_QBER, np.arange(len(TABLE_QBER)))
+    i, j = min(int(x), len(TABLE_N) - 2), min(int(y), len(TABLE_QBER) - 2)
+    u, v = x - i, y - j
+    weights = np.array([[(1 - u) * (1 - v), (1 - u) * v], [u * (1 - v), u * v]])
+    return SessionParameters(*(float((a[i:i + 2, j:j + 2] * weights).sum()) for a in table))
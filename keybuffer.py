@@ -0,0 +1,176 @@
+"""
+Bit-packed key buffer.
+
+Bits are stored in np.packbits order (bit i is the most significant free bit
+of byte i // 8) inside a zero-padded array of uint64 words, so whole-key
+operations (XOR, AND, popcount, equality) run 64 bits at a time while
+bytes()/memoryview() export the packed bytes without copying. Padding bits
+past len(key) are always zero.
+"""
+from typing import Optional
+
+import numpy as np
+
+
+class KeyBuffer:
+    """Fixed-length bit string backed by packed uint64 words."""
+
+    def __init__(self, n: int, words: Optional[np.ndarray] = None):
+        self.n = n
+        self.words = np.zeros((n + 63) // 64, dtype=np.uint64) if words is None else words
+
+    @classmethod
+    def from_bits(cls, bits) -> 'KeyBuffer':
+        """Pack an array of 0/1 values."""
+        bits = np.asarray(bits)
+        return cls.from_packed(np.packbits(bits.astype(bool, copy=False)), len(bits))
+
+    @classmethod
+    def from_packed(cls, packed: np.ndarray, n: int) -> 'KeyBuffer':
+        """Wrap np.packbits output (or any packed bytes) holding n bits."""
+        key = cls(n)
+        nbytes = (n + 7) // 8
+        key.bytes_view()[:nbytes] = np.frombuffer(packed, dtype=np.uint8, count=nbytes)
+        return key.trim()
+
+    @classmethod
+    def from_string(cls, bitstring: str) -> 'KeyBuffer':
+        """Pack a '0'/'1' string."""
+        return cls.from_bits(np.frombuffer(bitstring.encode(), dtype=np.uint8) - ord('0'))
+
+    # -----------------------------
+    # views and export
+    # -----------------------------
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        return (self.n + 7) // 8
+
+    def bytes_view(self) -> np.ndarray:
+        """The words as a writable uint8 array (including padding bytes)."""
+        return self.words.view(np.uint8)
+
+    def memoryview(self) -> memoryview:
+        """Zero-copy view of the packed key bytes."""
+        return memoryview(self.bytes_view()[:self.nbytes])
+
+    def tobytes(self) -> bytes:
+        return self.bytes_view()[:self.nbytes].tobytes()
+
+    def to_bits(self) -> np.ndarray:
+        """Unpack to a bool array."""
+        return np.unpackbits(self.bytes_view(), count=self.n).view(bool)
+
+    def __str__(self) -> str:
+        return (self.to_bits().view(np.uint8) + ord('0')).tobytes().decode()
+
+    def __repr__(self) -> str:
+        return f"KeyBuffer(n={self.n}, weight={self.weight()})"
+
+    def trim(self) -> 'KeyBuffer':
+        """Clear the padding bits past n (in place)."""
+        tail = self.n % 8
+        nbytes = self.nbytes
+        data = self.bytes_view()
+        if tail:
+            data[nbytes - 1] &= (0xFF << (8 - tail)) & 0xFF
+        data[nbytes:] = 0
+        return self
+
+    def copy(self) -> 'KeyBuffer':
+        return KeyBuffer(self.n, self.words.copy())
+
+    # -----------------------------
+    # word operations
+    # -----------------------------
+    def _check(self, other: 'KeyBuffer') -> None:
+        if self.n != other.n:
+            raise ValueError(f"key lengths differ: {self.n} != {other.n}")
+
+    def __xor__(self, other: 'KeyBuffer') -> 'KeyBuffer':
+        self._check(other)
+        return KeyBuffer(self.n, self.words ^ other.words)
+
+    def __and__(self, other: 'KeyBuffer') -> 'KeyBuffer':
+        self._check(other)
+        return KeyBuffer(self.n, self.words & other.words)
+
+    def __or__(self, other: 'KeyBuffer') -> 'KeyBuffer':
+        self._check(other)
+        return KeyBuffer(self.n, self.words | other.words)
+
+    def __invert__(self) -> 'KeyBuffer':
+        return KeyBuffer(self.n, ~self.words).trim()
+
+    def __ixor__(self, other: 'KeyBuffer') -> 'KeyBuffer':
+        self._check(other)
+        self.words ^= other.words
+        return self
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, KeyBuffer):
+            return NotImplemented
+        return self.n == other.n and np.array_equal(self.words, other.words)
+
+    __hash__ = None
+
+    def weight(self) -> int:
+        """Hamming weight (number of 1 bits)."""
+        return int(np.bitwise_count(self.words).sum(dtype=np.int64))
+
+    def parity(self, indices=None) -> int:
+        """Parity of the bits at 'indices' (of the whole key when None)."""
+        if indices is None:
+            return self.weight() & 1
+        return int(np.bitwise_xor.reduce(self.get(indices).view(np.uint8), initial=0))
+
+    def masked_parity(self, mask: 'KeyBuffer') -> int:
+        """Parity of the bits selected by 'mask', using word operations only."""
+        return (self & mask).weight() & 1
+
+    # -----------------------------
+    # indexing
+    # -----------------------------
+    def get(self, indices) -> np.ndarray:
+        """Bits at an index array (bool array)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        data = self.bytes_view()
+        return ((data[indices >> 3] >> (7 - (indices & 7)).astype(np.uint8)) & 1).view(bool)
+
+    def gather(self, indices) -> 'KeyBuffer':
+        """New key made of the bits at 'indices', in that order."""
+        return KeyBuffer.from_bits(self.get(indices))
+
+    def scatter(self, indices, values) -> None:
+        """
+        Set the (distinct) bits at 'indices' to 'values' in place. 'values' is
+        a bool array, a KeyBuffer or a scalar.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if isinstance(values, KeyBuffer):
+            values = values.to_bits()
+        values = np.broadcast_to(np.asarray(values, dtype=bool), indices.shape)
+        data = self.bytes_view()
+        bits = (1 << (7 - (indices & 7))).astype(np.uint8)
+        np.bitwise_and.at(data, indices >> 3, ~bits)
+        np.bitwise_or.at(data, indices[values] >> 3, bits[values])
+
+    def flip(self, indices) -> None:
+        """Invert the bits at 'indices' in place (repeated indices flip repeatedly)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        np.bitwise_xor.at(self.bytes_view(), indices >> 3,
+                          (1 << (7 - (indices & 7))).astype(np.uint8))
+
+    def compress(self, mask: 'KeyBuffer') -> 'KeyBuffer':
+        """New key made of the bits where 'mask' is set."""
+        self._check(mask)
+        return KeyBuffer.from_bits(self.to_bits()[mask.to_bits()])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return KeyBuffer.from_bits(self.to_bits()[index])
+        if not -self.n <= index < self.n:
+            raise IndexError("key index out of range")
+        return int(self.get(index % self.n))
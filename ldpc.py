@@ -0,0 +1,264 @@
+"""
+One-way LDPC reconciliation.
+
+A splits her key into frames, sends the syndrome H x of each frame, and B
+decodes his noisy copy with belief propagation (normalized min-sum or
+sum-product) on the Tanner graph of H. There is a single message from A to
+B.
+
+- Parity-check matrices are random (3, dc)-regular codes stored as
+  scipy.sparse CSR matrices. They are built once per (frame length, rate)
+  and cached on disk under LDPC_CACHE_DIR.
+- Messages live in (frames, edges) arrays with edges in CSR (check-major)
+  order. Check updates use ufunc.reduceat over each row's edges, and
+  variable updates are a sparse edge-to-variable product, so all frames
+  decode together.
+- Rate adaptation follows Elkouss et al.: of every frame's n bits, d =
+  ADAPT_FRACTION * n are either punctured (random bits unknown to B, LLR 0)
+  or shortened (public random bits, LLR +-inf). The split is chosen from the
+  QBER so that the effective rate is 1 - efficiency * h(QBER) for the
+  nearest mother rate in RATES.
+
+These random regular codes are far from capacity at 2**15 bits, and the gap
+grows at low QBER. The efficiency is therefore looked up per QBER in
+EFFICIENCY_TABLE. Each entry is about 0.1 above the lowest efficiency at which
+no frame failed in 32-48 frame trials: from 1.4 at 11 % QBER up to ~2 at
+0.5 %. Optimized irregular codes would close most of that gap.
+
+Leakage per frame is the syndrome length minus the punctured bits. Frames
+whose syndrome is not reached within max_iter iterations are dropped from
+both keys.
+"""
+import os
+import time
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+from scipy import sparse
+
+from keybuffer import KeyBuffer
+from privacy import binary_entropy
+
+
+FRAME_BITS = 1 << 15
+RATES = (0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+COLUMN_WEIGHT = 3
+ADAPT_FRACTION = 0.1           # fraction of each frame punctured or shortened
+# (QBER, target leak / h(QBER)) for reliable decoding, interpolated linearly
+EFFICIENCY_TABLE = ((0.001, 3.2), (0.0025, 2.6), (0.005, 2.1), (0.01, 1.9), (0.015, 1.75),
+                    (0.02, 1.7), (0.03, 1.6), (0.04, 1.55), (0.05, 1.5), (0.08, 1.45),
+                    (0.11, 1.4))
+MAX_ITER = 60
+MIN_SUM_SCALE = 0.8            # normalized min-sum correction
+LDPC_CACHE_DIR = '.ldpc_cache'
+MAX_LLR = 50.0
+
+
+# -----------------------------
+# parity-check matrices
+# -----------------------------
+def build_parity_check(n: int, rate: float, seed: int = 0) -> sparse.csr_matrix:
+    """
+    Random (COLUMN_WEIGHT, dc)-regular parity-check matrix of an (n, rate) code:
+    every variable joins COLUMN_WEIGHT distinct checks, spread evenly over the
+    n * (1 - rate) checks.
+    """
+    rng = np.random.default_rng(seed)
+    m = int(round(n * (1 - rate)))
+    # check sockets dealt round-robin so row degrees differ by at most one
+    sockets = rng.permutation(np.arange(n * COLUMN_WEIGHT) % m)
+    rows = sockets.reshape(n, COLUMN_WEIGHT)
+    # re-deal duplicate checks within a column
+    for _ in range(100):
+        rows.sort(axis=1)
+        dup = np.flatnonzero((np.diff(rows, axis=1) == 0).any(axis=1))
+        if len(dup) == 0:
+            break
+        swap = rng.integers(0, n, len(dup))
+        rows[dup, 0], rows[swap, 0] = rows[swap, 0], rows[dup, 0].copy()
+    cols = np.repeat(np.arange(n), COLUMN_WEIGHT)
+    H = sparse.csr_matrix((np.ones(len(cols), dtype=np.uint8), (rows.ravel(), cols)), shape=(m, n))
+    H.data[:] = 1           # any duplicate left over collapses to a single edge
+    H.eliminate_zeros()
+    return H
+
+
+@lru_cache(maxsize=16)
+def parity_check(n: int, rate: float, cache_dir: Optional[str] = LDPC_CACHE_DIR) -> sparse.csr_matrix:
+    """Parity-check matrix for (n, rate), loaded from / saved to cache_dir."""
+    path = None if cache_dir is None else os.path.join(cache_dir, f'H_{n}_{rate:.3f}.npz')
+    if path is not None and os.path.exists(path):
+        try:
+            return sparse.load_npz(path).tocsr()
+        except (OSError, ValueError):
+            pass            # unreadable cache entry: rebuild it
+    H = build_parity_check(n, rate)
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + '.tmp.npz'
+        sparse.save_npz(tmp, H)
+        os.replace(tmp, path)
+    return H
+
+
+def syndromes(H: sparse.csr_matrix, frames: np.ndarray) -> np.ndarray:
+    """Syndromes of a (frames, n) 0/1 array: (frames, m) uint8."""
+    return ((H @ frames.T.astype(np.int64)) & 1).T.astype(np.uint8)
+
+
+# -----------------------------
+# belief propagation
+# -----------------------------
+class TannerGraph:
+    """Edge arrays of H in CSR (check-major) order."""
+
+    def __init__(self, H: sparse.csr_matrix):
+        self.H = H
+        self.m, self.n = H.shape
+        self.row_start = H.indptr[:-1]
+        self.edge_check = np.repeat(np.arange(self.m), np.diff(H.indptr))
+        self.edge_var = H.indices
+        edges = len(self.edge_var)
+        self.edge_to_var = sparse.csr_matrix(
+            (np.ones(edges), (np.arange(edges), self.edge_var)), shape=(edges, self.n))
+
+    def check_update(self, v2c: np.ndarray, syndrome_sign: np.ndarray, method: str) -> np.ndarray:
+        """Check-to-variable messages from variable-to-check messages (frames, edges)."""
+        row, start = self.edge_check, self.row_start
+        neg = v2c < 0
+        parity = (np.add.reduceat(neg.view(np.uint8), start, axis=1) & 1).astype(bool) ^ syndrome_sign
+        sign = np.where(parity[:, row] ^ neg, -1.0, 1.0)
+        mag = np.abs(v2c)
+        if method == 'min-sum':
+            min1 = np.minimum.reduceat(mag, start, axis=1)
+            is_min = mag == min1[:, row]
+            min2 = np.minimum.reduceat(np.where(is_min, np.inf, mag), start, axis=1)
+            unique = np.add.reduceat(is_min.view(np.uint8), start, axis=1) == 1
+            excl = np.where(is_min & unique[:, row], min2[:, row], min1[:, row])
+            return sign * MIN_SUM_SCALE * np.minimum(excl, MAX_LLR)
+        # sum-product: phi(x) = -log tanh(x/2) is its own inverse
+        phi = -np.log(np.tanh(np.clip(mag, 1e-12, MAX_LLR) / 2))
+        total = np.add.reduceat(phi, start, axis=1)
+        excl = np.clip(total[:, row] - phi, 1e-12, MAX_LLR)
+        return sign * -np.log(np.tanh(excl / 2))
+
+    def decode(self, llr: np.ndarray, syndrome: np.ndarray, max_iter: int = MAX_ITER,
+               method: str = 'min-sum'):
+        """
+        Decode frames (llr: (frames, n), syndrome: (frames, m)).
+        Returns (bits (frames, n) bool, converged (frames,) bool, iterations).
+        """
+        if method not in ('min-sum', 'sum-product'):
+            raise ValueError("method must be 'min-sum' or 'sum-product'")
+        syndrome_sign = syndrome.astype(bool)
+        v2c = llr[:, self.edge_var]
+        bits = llr < 0
+        converged = np.zeros(len(llr), dtype=bool)
+        active = np.arange(len(llr))
+        it = 0
+        for it in range(1, max_iter + 1):
+            c2v = self.check_update(v2c, syndrome_sign[active], method)
+            total = llr[active] + c2v @ self.edge_to_var
+            v2c = total[:, self.edge_var] - c2v
+            hard = total < 0
+            bits[active] = hard
+            ok = (syndromes(self.H, hard) == syndrome[active]).all(axis=1)
+            converged[active[ok]] = True
+            if ok.all():
+                break
+            keep = ~ok
+            active, v2c = active[keep], v2c[keep]
+        return bits, converged, it
+
+
+# -----------------------------
+# rate adaptation and reconciliation
+# -----------------------------
+def efficiency_for(qber: float) -> float:
+    """Reliable-decoding efficiency at 'qber' from EFFICIENCY_TABLE (clamped at its ends)."""
+    qbers, efficiencies = zip(*EFFICIENCY_TABLE)
+    return float(np.interp(qber, qbers, efficiencies))
+
+
+def adapted_code(qber: float, n: int = FRAME_BITS, efficiency: Optional[float] = None):
+    """
+    Mother rate and (punctured, shortened) counts that bring an (n, rate)
+    code to the effective rate 1 - efficiency * h(qber). efficiency=None
+    uses efficiency_for(qber).
+    """
+    efficiency = efficiency_for(qber) if efficiency is None else efficiency
+    d = int(ADAPT_FRACTION * n)
+    target = 1 - efficiency * binary_entropy(qber)
+    # effective rate (R0*n - s) / (n - d) with s = R0*n - target*(n - d) shortened bits;
+    # puncturing hurts BP more than shortening, so take the highest R0 with s <= d
+    fits = [r for r in RATES if r * n - target * (n - d) <= d]
+    rate = max(fits) if fits else min(RATES)
+    shortened = int(round(np.clip(rate * n - target * (n - d), 0, d)))
+    # B cannot recover more punctured bits than there are checks: at very low
+    # QBER the effective rate saturates and the rest of d is shortened
+    punctured = min(d - shortened, int(n * (1 - rate)) // 2)
+    return rate, punctured, d - punctured
+
+
+class LDPCResult(NamedTuple):
+    key_A: KeyBuffer        # A's key restricted to the decoded frames
+    key: KeyBuffer          # B's reconciled key (same positions)
+    leaked: int             # syndrome bits minus punctured bits, over all frames
+    frames: int
+    failed_frames: int
+    iterations: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """Reconciled Mbit/s."""
+        return len(self.key) / max(self.seconds, 1e-12) / 1e6
+
+
+def ldpc_reconcile(key_A: KeyBuffer, key_B: KeyBuffer, qber: float, n: int = FRAME_BITS,
+                   efficiency: Optional[float] = None, max_iter: int = MAX_ITER,
+                   method: str = 'min-sum', rng: Optional[np.random.Generator] = None,
+                   cache_dir: Optional[str] = LDPC_CACHE_DIR) -> LDPCResult:
+    """
+    Reconcile key_B towards key_A with one syndrome message per frame. Key
+    bits past the last full frame are discarded. 'qber' should be an upper
+    estimate (e.g. a confidence bound); efficiency=None uses efficiency_for(qber).
+    """
+    if len(key_A) != len(key_B):
+        raise ValueError("keys must have equal length")
+    rng = np.random.default_rng() if rng is None else rng
+    start = time.perf_counter()
+    qber = min(max(qber, 1e-4), 0.5 - 1e-4)
+    rate, punctured, shortened = adapted_code(qber, n, efficiency)
+    H = parity_check(n, rate, cache_dir)
+    graph = TannerGraph(H)
+    payload = n - punctured - shortened
+    frames = len(key_A) // payload
+    if frames == 0:
+        return LDPCResult(KeyBuffer(0), KeyBuffer(0), 0, 0, 0, 0, time.perf_counter() - start)
+
+    # public frame layout: payload, punctured and shortened positions
+    layout = rng.permutation(n)
+    pay_pos, punc_pos, short_pos = np.split(layout, [payload, payload + punctured])
+    bits_A = key_A.to_bits()[:frames * payload].reshape(frames, payload)
+    bits_B = key_B.to_bits()[:frames * payload].reshape(frames, payload)
+    x = np.zeros((frames, n), dtype=np.uint8)
+    x[:, pay_pos] = bits_A
+    x[:, punc_pos] = rng.integers(0, 2, (frames, punctured))      # A's secret padding
+    short_bits = rng.integers(0, 2, (frames, shortened))           # public padding
+    x[:, short_pos] = short_bits
+    syndrome = syndromes(H, x)                                      # A -> B
+
+    # B's channel LLRs
+    llr = np.zeros((frames, n))
+    llr[:, pay_pos] = np.where(bits_B, -1.0, 1.0) * np.log((1 - qber) / qber)
+    llr[:, short_pos] = np.where(short_bits, -MAX_LLR, MAX_LLR)
+    decoded, converged, iterations = graph.decode(llr, syndrome, max_iter, method)
+
+    ok = np.flatnonzero(converged)
+    key = KeyBuffer.from_bits(decoded[ok][:, pay_pos].ravel())
+    reference = KeyBuffer.from_bits(bits_A[ok].ravel())
+    leaked = frames * (graph.m - punctured)
+    return LDPCResult(reference, key, leaked, frames, frames - len(ok), iterations,
+                      time.perf_counter() - start)
@@ -0,0 +1,317 @@
+"""
+Polar-code reconciliation (Slepian-Wolf source coding with side information).
+
+A polar-transforms every frame of her raw key, u = x G_N with
+G_N = [[1, 0], [1, 1]]^(x log2 N), and sends the frozen part u_F. She also
+sends VERIFY_BITS public random parities of x. B knows u_F, so he decodes u
+from his noisy copy with successive cancellation (SC) or SC list (SCL)
+decoding. Then x = u G_N, because G_N is its own inverse. Each frame leaks
+|F| + VERIFY_BITS bits.
+
+- Frozen sets are designed for a BSC(QBER) by a Monte-Carlo genie-aided SC
+  run, with every butterfly stage one vectorized numpy step. Positions that
+  never or always fail are ordered by the Bhattacharyya recursion
+  z- = 2z - z^2, z+ = z^2. The QBER is rounded up to a QBER_STEP grid, and
+  reliability orders are cached per (frame length, design QBER) on disk
+  under POLAR_CACHE_DIR.
+- The decoder walks the code tree and vectorizes every node over its
+  butterfly stage, all frames and all list paths. All-frozen (rate-0) and
+  all-information (rate-1) subtrees are decoded in one step each (Fast-SSCL).
+  In a rate-1 node, the list forks on its min(L - 1, size) least reliable
+  bits, which is exact. The work is O(L N log N) per frame, with far fewer
+  Python calls than N.
+- The verification parities pick the surviving list path, as in CRC-aided
+  SCL. Frames where no path matches are dropped from both keys.
+
+With L = 8 at 2**16 bits, a fixed efficiency of 1.3 still failed some
+frames below 2 % QBER (4/32 at 1 %, 11/32 at 0.25 %). The efficiency is
+therefore looked up per QBER in POLAR_EFFICIENCY_TABLE. Each entry is at
+least 0.1 above the lowest efficiency with no failed frame in 32 frames, and
+no frame failed in 64-frame checks of the table. It is 1.4 from 2 % QBER up,
+rising to 1.8 at 0.25 %. Longer frames polarize further.
+Decoding time per key bit stays roughly flat as N grows: about 1.5-2 us/bit
+for N = 2**16 .. 2**18 at L = 8, with 16 frames per batch.
+"""
+import os
+import time
+from functools import lru_cache
+from math import ceil
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from keybuffer import KeyBuffer
+from privacy import binary_entropy
+
+
+POLAR_BITS = 1 << 16           # frame length N (power of two)
+LIST_SIZE = 8                  # SCL list size (1 = plain SC)
+# (QBER, frozen bits / (N h(QBER))) for reliable decoding, interpolated linearly
+POLAR_EFFICIENCY_TABLE = ((0.001, 2.0), (0.0025, 1.8), (0.005, 1.6), (0.01, 1.5),
+                          (0.015, 1.5), (0.02, 1.4), (0.11, 1.4))
+QBER_STEP = 0.0025             # design QBER grid
+DESIGN_SAMPLES = 1000          # Monte-Carlo frames per frozen-set design
+DESIGN_BATCH = 64
+POLAR_CACHE_DIR = '.polar_cache'
+VERIFY_BITS = 32               # random parities per frame for path selection
+POLAR_BATCH = 16               # frames decoded together
+MAX_LLR = 50.0
+
+
+# -----------------------------
+# code construction
+# -----------------------------
+def polar_transform(u: np.ndarray) -> np.ndarray:
+    """x = u G_N over the last axis (length a power of two), log2 N XOR stages."""
+    x = np.array(u, dtype=np.uint8)
+    n = x.shape[-1]
+    h = 1
+    while h < n:
+        view = x.reshape(*x.shape[:-1], n // (2 * h), 2, h)
+        view[..., 0, :] ^= view[..., 1, :]
+        h *= 2
+    return x
+
+
+def bhattacharyya(n: int, qber: float) -> np.ndarray:
+    """Bhattacharyya parameter of each synthetic channel u_i of BSC(qber)."""
+    z = np.array([2 * np.sqrt(qber * (1 - qber))])
+    for _ in range(int(np.log2(n))):
+        z = np.stack([2 * z - z * z, z * z], axis=1).ravel()
+    return z
+
+
+def genie_error_rates(n: int, qber: float, samples: int = DESIGN_SAMPLES,
+                      seed: int = 0) -> np.ndarray:
+    """
+    Monte-Carlo error rate of every u_i under genie-aided min-sum SC on
+    BSC(qber). The all-zero codeword suffices by symmetry, so every stage
+    maps all (frames, nodes, size) LLRs to their children in one step.
+    """
+    rng = np.random.default_rng(seed)
+    errors = np.zeros(n)
+    for done in range(0, samples, DESIGN_BATCH):
+        frames = min(DESIGN_BATCH, samples - done)
+        llr = np.where(rng.random((frames, 1, n)) < qber, -1.0, 1.0).astype(np.float32)
+        while llr.shape[2] > 1:
+            a, b = np.split(llr, 2, axis=2)
+            left = np.copysign(np.minimum(np.abs(a), np.abs(b)), a * b)
+            llr = np.stack([left, a + b], axis=2).reshape(frames, -1, llr.shape[2] // 2)
+        leaf = llr[:, :, 0]
+        errors += (leaf < 0).sum(axis=0) + 0.5 * (leaf == 0).sum(axis=0)
+    return errors / samples
+
+
+def design_qber(qber: float) -> float:
+    """qber rounded up to the QBER_STEP grid (within (0, 0.5))."""
+    return min(max(ceil(qber / QBER_STEP - 1e-9), 1) * QBER_STEP, 0.5 - QBER_STEP)
+
+
+@lru_cache(maxsize=32)
+def reliability_order(n: int, qber: float,
+                      cache_dir: Optional[str] = POLAR_CACHE_DIR) -> np.ndarray:
+    """
+    u positions from least to most reliable on BSC(qber): genie-aided error
+    rates, ties (rates of 0 or 1) broken by the Bhattacharyya parameter.
+    Loaded from / saved to cache_dir. The result is read-only.
+    """
+    if n & (n - 1):
+        raise ValueError("polar frame length must be a power of two")
+    path = None if cache_dir is None else os.path.join(cache_dir, f'order_{n}_{qber:.4f}.npy')
+    order = None
+    if path is not None and os.path.exists(path):
+        try:
+            order = np.load(path)
+        except (OSError, ValueError):
+            pass            # unreadable cache entry: redesign
+    if order is None:
+        order = np.lexsort((-bhattacharyya(n, qber), -genie_error_rates(n, qber)))
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = path + '.tmp.npy'
+            np.save(tmp, order)
+            os.replace(tmp, path)
+    order.flags.writeable = False
+    return order
+
+
+def efficiency_for(qber: float) -> float:
+    """Reliable-decoding efficiency at 'qber' from POLAR_EFFICIENCY_TABLE (clamped at its ends)."""
+    qbers, efficiencies = zip(*POLAR_EFFICIENCY_TABLE)
+    return float(np.interp(qber, qbers, efficiencies))
+
+
+def frozen_set(n: int, qber: float, efficiency: Optional[float] = None,
+               cache_dir: Optional[str] = POLAR_CACHE_DIR) -> np.ndarray:
+    """
+    Bool mask of the ceil(efficiency * n * h) least reliable u positions at
+    design_qber(qber). efficiency=None uses efficiency_for(qber).
+    """
+    q = design_qber(qber)
+    efficiency = efficiency_for(q) if efficiency is None else efficiency
+    count = min(n, ceil(efficiency * n * binary_entropy(q)))
+    frozen = np.zeros(n, dtype=bool)
+    frozen[reliability_order(n, q, cache_dir)[:count]] = True
+    return frozen
+
+
+# -----------------------------
+# Fast-SSCL decoding
+# -----------------------------
+def _take(a: np.ndarray, perm: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Reorder the list axis of a (frames, L, ...) array by perm (frames, L).
+    perm None, or a list axis of length 1 (shared by all paths), keeps a.
+    """
+    if perm is None or a.shape[1] == 1:
+        return a
+    return a[np.arange(len(perm))[:, None], perm]
+
+
+class PolarDecoder:
+    """SC / SCL decoder of one frozen set; frozen u values are given per frame."""
+
+    def __init__(self, frozen: np.ndarray, list_size: int = LIST_SIZE):
+        self.frozen = frozen
+        self.list_size = list_size
+        # prefix sums classify any dyadic node as rate-0 / rate-1 in O(1)
+        self.frozen_prefix = np.concatenate(([0], np.cumsum(frozen)))
+
+    def _node_frozen(self, lo: int, size: int) -> int:
+        return int(self.frozen_prefix[lo + size] - self.frozen_prefix[lo])
+
+    def decode(self, llr: np.ndarray, u_frozen: np.ndarray):
+        """
+        Decode frames (llr: (frames, N), u_frozen: (frames, N) with the frozen
+        values at frozen positions). Returns (x, metric): candidate frames
+        (frames, L, N) uint8 and path metrics (frames, L), lower is better.
+        """
+        frames, n = llr.shape
+        L = self.list_size
+        self.u_frozen = u_frozen
+        alpha = np.broadcast_to(llr[:, None, :], (frames, L, n))
+        # one live path per frame; the copies only take part once the list forks
+        metric = np.full((frames, L), np.inf)
+        metric[:, 0] = 0.0
+        x, metric, _ = self._node(alpha, 0, n, metric)
+        return np.broadcast_to(x, (frames, L, n)), metric
+
+    def _node(self, alpha: np.ndarray, lo: int, size: int, metric: np.ndarray):
+        """
+        Decode the subtree of u[lo:lo+size]. Returns (beta, metric, perm), where
+        perm maps every new path to its path on entry (None: unchanged).
+        """
+        n_frozen = self._node_frozen(lo, size)
+        if n_frozen == size:
+            # rate-0: beta is known; penalize paths whose LLR signs disagree
+            beta = polar_transform(self.u_frozen[:, lo:lo + size])[:, None, :]
+            wrong = (alpha < 0) != beta.astype(bool)
+            metric = metric + np.where(wrong, np.abs(alpha), 0.0).sum(axis=2)
+            return beta, metric, None
+        if n_frozen == 0:
+            return self._rate_one(alpha, metric)
+
+        h = size // 2
+        a, b = alpha[..., :h], alpha[..., h:]
+        left = np.copysign(np.minimum(np.abs(a), np.abs(b)), a * b)
+        beta_l, metric, perm1 = self._node(left, lo, h, metric)
+        a, b = _take(a, perm1), _take(b, perm1)
+        right = b + np.where(beta_l.astype(bool), -a, a)
+        beta_r, metric, perm2 = self._node(right, lo + h, h, metric)
+        beta_l = _take(beta_l, perm2)
+        perm = perm2 if perm1 is None else _take(perm1, perm2)
+        return np.concatenate(np.broadcast_arrays(beta_l ^ beta_r, beta_r), axis=2), metric, perm
+
+    def _rate_one(self, alpha: np.ndarray, metric: np.ndarray):
+        """Hard decisions, forking the list on the least reliable bits."""
+        frames, L, size = alpha.shape
+        beta = (alpha < 0).astype(np.uint8)
+        forks = min(L - 1, size)
+        if forks == 0:
+            return beta, metric, None
+        mag = np.abs(alpha)
+        weak = (np.argpartition(mag, forks - 1, axis=2)[..., :forks] if forks < size else
+                np.broadcast_to(np.arange(size), alpha.shape))
+        weak_mag = np.take_along_axis(mag, weak, axis=2)
+        rows = np.arange(frames)[:, None]
+        perm = np.broadcast_to(np.arange(L), (frames, L))
+        flips = np.zeros((frames, L, forks), dtype=np.uint8)
+        for s in range(forks):
+            # every path either keeps its decision or flips bit weak[..., s]
+            penalty = weak_mag[rows, perm, s]
+            candidates = np.concatenate([metric, metric + penalty], axis=1)
+            best = np.argsort(candidates, axis=1, kind='stable')[:, :L]
+            parent = best % L
+            metric = candidates[rows, best]
+            perm, flips = perm[rows, parent], flips[rows, parent]
+            flips[..., s] = best >= L
+        beta = beta[rows, perm]
+        beta[rows[:, :, None], np.arange(L)[:, None], weak[rows, perm]] ^= flips   # distinct per path
+        return beta, metric, perm
+
+
+# -----------------------------
+# reconciliation
+# -----------------------------
+class PolarResult(NamedTuple):
+    key_A: KeyBuffer        # A's key restricted to the decoded frames
+    key: KeyBuffer          # B's reconciled key (same positions)
+    leaked: int             # frozen bits plus verification parities, over all frames
+    frames: int
+    failed_frames: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """Reconciled Mbit/s."""
+        return len(self.key) / max(self.seconds, 1e-12) / 1e6
+
+
+def polar_reconcile(key_A: KeyBuffer, key_B: KeyBuffer, qber: float, n: int = POLAR_BITS,
+                    list_size: int = LIST_SIZE, efficiency: Optional[float] = None,
+                    rng: Optional[np.random.Generator] = None) -> PolarResult:
+    """
+    Reconcile key_B towards key_A with one message per frame. Key bits past
+    the last full frame are discarded. 'qber' should be an upper estimate
+    (e.g. a confidence bound); efficiency=None uses efficiency_for(qber).
+    """
+    if len(key_A) != len(key_B):
+        raise ValueError("keys must have equal length")
+    rng = np.random.default_rng() if rng is None else rng
+    start = time.perf_counter()
+    frames = len(key_A) // n
+    if frames == 0:
+        return PolarResult(KeyBuffer(0), KeyBuffer(0), 0, 0, 0, time.perf_counter() - start)
+    qber = min(max(qber, 1e-4), 0.5 - 1e-4)
+    frozen = frozen_set(n, qber, efficiency)
+    verify = rng.integers(0, 2, (VERIFY_BITS, n), dtype=np.uint8)        # public
+
+    # A -> B: frozen part of u = x G_N and the verification parities
+    x_A = key_A.to_bits()[:frames * n].reshape(frames, n).view(np.uint8)
+    u_frozen = np.where(frozen, polar_transform(x_A), 0).astype(np.uint8)
+    parities = (x_A.astype(np.float32) @ verify.T.astype(np.float32)) % 2
+
+    # B: channel LLRs of his copy, then SCL and the best path with matching parities
+    x_B = key_B.to_bits()[:frames * n].reshape(frames, n)
+    decoder = PolarDecoder(frozen, list_size)
+    verify_f = verify.T.astype(np.float32)
+    decoded = np.empty((frames, n), dtype=np.uint8)
+    ok = np.zeros(frames, dtype=bool)
+    for lo in range(0, frames, POLAR_BATCH):
+        batch = slice(lo, lo + POLAR_BATCH)
+        llr = np.where(x_B[batch], -1.0, 1.0) * min(np.log((1 - qber) / qber), MAX_LLR)
+        candidates, metric = decoder.decode(llr, u_frozen[batch])
+        # float32 products count at most n <= 2**24 ones exactly
+        match = ((candidates.astype(np.float32) @ verify_f) % 2 ==
+                 parities[batch, None, :]).all(axis=2)
+        metric = np.where(match, metric, np.inf)
+        best = metric.argmin(axis=1)
+        rows = np.arange(len(best))
+        decoded[batch] = candidates[rows, best]
+        ok[batch] = np.isfinite(metric[rows, best])
+
+    key = KeyBuffer.from_bits(decoded[ok].ravel())
+    reference = KeyBuffer.from_bits(x_A[ok].ravel())
+    leaked = frames * (int(frozen.sum()) + VERIFY_BITS)
+    return PolarResult(reference, key, leaked, frames, frames - int(ok.sum()),
+                       time.perf_counter() - start)
@@ -0,0 +1,142 @@
+"""
+Privacy amplification by Toeplitz hashing.
+
+A random m x n Toeplitz matrix T over GF(2) is defined by a seed of
+n + m - 1 bits s, with T[i, j] = s[i - j + n - 1]. Then (T x)_i is entry
+i + n - 1 of the integer convolution s * x, taken mod 2. The convolution
+is computed with a real FFT (scipy.fft), so hashing costs O(n log n) instead
+of O(n * m). Convolution values are at most n, which float64 FFTs round
+exactly for keys far beyond 1e8 bits.
+
+Keys, seeds and outputs are KeyBuffers.
+
+Keys too large for memory are amplified in streaming mode: the key is read
+in fixed-size blocks (key_blocks / memmap_key_blocks), and each block is
+hashed with its own Toeplitz matrix at a fixed compression ratio on a pool
+of worker threads (scipy.fft releases the GIL). The outputs are written
+incrementally in block order. Only a bounded number of blocks is in flight
+at a time.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from math import log2
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+import numpy as np
+from scipy import fft
+
+from keybuffer import KeyBuffer
+
+
+FFT_WORKERS = -1           # scipy.fft threads (-1 = all cores)
+STREAM_BLOCK_BITS = 1 << 20    # key bits per streamed block (multiple of 8)
+STREAM_WORKERS = 4             # blocks hashed concurrently
+
+
+def binary_entropy(p: float) -> float:
+    """h(p) = -p log2 p - (1-p) log2 (1-p)."""
+    if p <= 0 or p >= 1:
+        return 0.0
+    return -p * log2(p) - (1 - p) * log2(1 - p)
+
+
+def toeplitz_seed(n: int, m: int, rng: Optional[np.random.Generator] = None) -> KeyBuffer:
+    """Random seed (n + m - 1 bits) of an m x n Toeplitz matrix."""
+    rng = np.random.default_rng() if rng is None else rng
+    bits = max(0, n + m - 1)
+    return KeyBuffer.from_packed(rng.bytes((bits + 7) // 8), bits)
+
+
+def toeplitz_hash(key: KeyBuffer, seed: KeyBuffer, m: int,
+                  workers: int = FFT_WORKERS) -> KeyBuffer:
+    """Return T(seed) @ key over GF(2) as an m-bit key."""
+    n = len(key)
+    if len(seed) != max(0, n + m - 1):
+        raise ValueError(f"seed must have n + m - 1 = {n + m - 1} bits, got {len(seed)}")
+    if m == 0 or n == 0:
+        return KeyBuffer(m)
+    # a circular convolution of length >= n + m - 1 does not alias entries n-1 .. n+m-2
+    size = fft.next_fast_len(n + m - 1, real=True)
+    spectrum = (fft.rfft(seed.to_bits(), size, workers=workers) *
+                fft.rfft(key.to_bits(), size, workers=workers))
+    conv = fft.irfft(spectrum, size, workers=workers)[n - 1:n - 1 + m]
+    return KeyBuffer.from_bits(np.rint(conv).astype(np.int64) & 1)
+
+
+def privacy_amplify(key: KeyBuffer, m: int, rng: Optional[np.random.Generator] = None):
+    """
+    Hash 'key' down to m bits with a fresh random Toeplitz matrix.
+    Returns (final_key, seed); the seed is public.
+    """
+    if m > len(key):
+        raise ValueError(f"output length {m} exceeds key length {len(key)}")
+    seed = toeplitz_seed(len(key), m, rng)
+    return toeplitz_hash(key, seed, m), seed
+
+
+# -----------------------------
+# streaming mode
+# -----------------------------
+def key_blocks(key: KeyBuffer, block_bits: int = STREAM_BLOCK_BITS) -> Iterator[KeyBuffer]:
+    """Split an in-memory key into blocks of block_bits (the last may be shorter)."""
+    yield from _packed_blocks(key.bytes_view(), len(key), block_bits)
+
+
+def memmap_key_blocks(path: str, n_bits: Optional[int] = None,
+                      block_bits: int = STREAM_BLOCK_BITS) -> Iterator[KeyBuffer]:
+    """
+    Read a key of n_bits (default: the whole file) stored as packed bytes
+    (KeyBuffer.tobytes() / np.packbits order) block by block via np.memmap.
+    """
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    yield from _packed_blocks(data, 8 * len(data) if n_bits is None else n_bits, block_bits)
+
+
+def _packed_blocks(data: np.ndarray, n_bits: int, block_bits: int) -> Iterator[KeyBuffer]:
+    if block_bits <= 0 or block_bits % 8:
+        raise ValueError("block_bits must be a positive multiple of 8")
+    for start in range(0, n_bits, block_bits):
+        n = min(block_bits, n_bits - start)
+        yield KeyBuffer.from_packed(data[start // 8:(start + n + 7) // 8], n)
+
+
+def block_output_length(n: int, ratio: float) -> int:
+    """Output bits for an n-bit block: n * ratio rounded down to whole bytes."""
+    return int(n * ratio) // 8 * 8
+
+
+def stream_privacy_amplify(blocks: Iterable[KeyBuffer], ratio: float,
+                           rng: Optional[np.random.Generator] = None,
+                           workers: int = STREAM_WORKERS) -> Iterator[KeyBuffer]:
+    """
+    Hash every block with its own random Toeplitz matrix, compressing it to
+    block_output_length(len(block), ratio) bits, and yield the outputs in
+    block order. Seeds are drawn from rng in block order, so a peer holding
+    the same rng state reproduces them. Whole-byte outputs make the
+    concatenated stream bit-exact.
+    """
+    if not 0 <= ratio <= 1:
+        raise ValueError("compression ratio must be within [0, 1]")
+    rng = np.random.default_rng() if rng is None else rng
+    pending = deque()
+    with ThreadPoolExecutor(workers) as pool:
+        for block in blocks:
+            m = block_output_length(len(block), ratio)
+            seed = toeplitz_seed(len(block), m, rng)
+            pending.append(pool.submit(toeplitz_hash, block, seed, m, 1))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_key_stream(blocks: Iterable[KeyBuffer], out: Union[str, BinaryIO]) -> int:
+    """Write key blocks as packed bytes to a path or binary file. Returns the bits written."""
+    if isinstance(out, str):
+        with open(out, 'wb') as f:
+            return write_key_stream(blocks, f)
+    total = 0
+    for block in blocks:
+        out.write(block.memoryview())
+        total += len(block)
+    return total
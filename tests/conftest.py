@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: timing-based tests (deselect with -m "not slow")')
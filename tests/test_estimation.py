@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+import pytest
+
+from estimation import (BasisEstimates, estimate_from_sample, estimate_parameters, pauli_channel,
+                        rate_estimate)
+from keybuffer import KeyBuffer
+
+
+def noisy_keys(n: int, qber: float, rng: np.random.Generator):
+    key_A = KeyBuffer.from_packed(rng.bytes((n + 7) // 8), n)
+    return key_A, key_A ^ KeyBuffer.from_bits(rng.random(n) < qber)
+
+
+def test_estimate_from_sample():
+    rng = np.random.default_rng(0)
+    key_A, key_B = noisy_keys(10_000, 0.05, rng)
+    sample = KeyBuffer.from_bits(rng.random(10_000) < 0.2)
+    estimate = estimate_from_sample(key_A, key_B, sample)
+    a, b, s = key_A.to_bits(), key_B.to_bits(), sample.to_bits()
+    assert estimate.sample_size == s.sum()
+    assert estimate.mismatches == (a != b)[s].sum()
+    assert estimate.qber == pytest.approx(estimate.mismatches / estimate.sample_size)
+    assert np.array_equal(estimate.raw_A_key.to_bits(), a[~s])
+    assert np.array_equal(estimate.raw_B_key.to_bits(), b[~s])
+    with pytest.raises(ValueError):
+        estimate_from_sample(key_A, key_B, KeyBuffer(10_000))
+
+
+def test_estimate_parameters_sample_size():
+    rng = np.random.default_rng(1)
+    key_A, key_B = noisy_keys(1_000, 0.0, rng)
+    estimate = estimate_parameters(key_A, key_B, 0.25, rng)
+    assert estimate.sample_size == 250 and estimate.mismatches == 0
+    assert len(estimate.raw_A_key) == 750
+    with pytest.raises(ValueError):
+        estimate_parameters(KeyBuffer(0), KeyBuffer(0), 0.25, rng)
+
+
+@pytest.mark.slow
+def test_estimation_scales_linearly():
+    """Fit time ~ n**k over 1e4..1e7 sifted bits; k must stay near 1."""
+    rng = np.random.default_rng(0)
+    sizes = (10**4, 10**5, 10**6, 10**7)
+    times = []
+    for n in sizes:
+        key_A, key_B = noisy_keys(n, 0.05, rng)
+        best = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            estimate_parameters(key_A, key_B, 0.25, rng)
+            best = min(best, time.perf_counter() - start)
+        times.append(best)
+    exponent = np.polyfit(np.log(sizes), np.log(times), 1)[0]
+    assert exponent <= 1.25, f"parameter estimation scales as n^{exponent:.2f}"
+
+
+def channel_counts(R: np.ndarray, trials: int):
+    """Exact per-basis estimates and mismatched-basis counts for correlations R[b, a]."""
+    errors = np.round((1 - R) / 2 * trials).astype(int)
+    basis = BasisEstimates(rate_estimate(errors[0, 0], trials), rate_estimate(errors[1, 1], trials))
+    total = np.array([[0, trials], [trials, 0]])
+    return basis, total, total - errors * (total > 0)
+
+
+def test_pauli_channel_ignores_insignificant_off_diagonals():
+    # depolarizing channel (lambda = 0.9) with off-diagonal noise well inside the interval
+    R = np.array([[0.9, 0.002], [-0.001, 0.9]])
+    channel = pauli_channel(*channel_counts(R, 100_000))
+    assert channel.rotation == 0.0
+    assert np.allclose(channel.eigenvalues, [0.9, 0.9], atol=1e-4)
+    assert channel.probabilities.sum() == pytest.approx(1)
+    p_I, p_X, p_Y, p_Z = channel.probabilities
+    assert p_X == pytest.approx(p_Z, abs=1e-3)
+
+    noiseless = pauli_channel(*channel_counts(np.array([[1.0, 0.002], [0.001, 1.0]]), 100_000))
+    assert noiseless.rotation == 0.0
+    assert np.allclose(noiseless.probabilities, [1, 0, 0, 0])
+
+
+def test_pauli_channel_detects_frame_rotation():
+    theta = 0.2
+    R = 0.9 * np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    channel = pauli_channel(*channel_counts(R, 100_000))
+    assert channel.rotation == pytest.approx(theta, abs=0.01)
+    assert np.allclose(channel.eigenvalues, [0.9, 0.9], atol=0.01)
@@ -0,0 +1,57 @@
+from math import log, log2, sqrt
+
+import numpy as np
+import pytest
+
+from finite_key import (EC_EFFICIENCY, entropy, phase_error_bound, secure_key_length,
+                        two_basis_key_length)
+
+
+def test_entropy():
+    assert entropy(0) == 0 and entropy(1) == 1      # clipped at 0.5 from above
+    assert entropy(0.5) == pytest.approx(1)
+    assert entropy(0.11) == pytest.approx(0.4999, abs=1e-4)
+    assert np.allclose(entropy([0.1, 0.9]), [entropy(0.1), entropy(0.5)])
+
+
+def test_phase_error_bound_formulas():
+    n, k, e, eps = 10_000, 2_000, 40, 1e-10
+    serfling = sqrt((n + k) / (n * k) * (k + 1) / k * log(2 / eps))
+    hoeffding = (n + k) / n * sqrt(log(1 / eps) / (2 * k))
+    assert phase_error_bound(n, k, e, eps, 'serfling') == pytest.approx(e / k + serfling)
+    assert phase_error_bound(n, k, e, eps, 'hoeffding') == pytest.approx(e / k + hoeffding)
+    assert phase_error_bound(n, 0, 0) == np.inf
+    assert phase_error_bound(n, 4 * k, 4 * e) < phase_error_bound(n, k, e)
+    with pytest.raises(ValueError):
+        phase_error_bound(n, k, e, method='chernoff')
+
+
+def test_secure_key_length_formula():
+    n, k, e, leaked = 1_000_000, 100_000, 2_000, 150_000
+    eps_sec, eps_cor = 1e-10, 1e-15
+    bound = phase_error_bound(n, k, e, eps_sec)
+    expected = n * (1 - entropy(bound)) - leaked - log2(2 / (eps_sec ** 2 * eps_cor))
+    assert secure_key_length(n, k, e, leaked, eps_sec, eps_cor) == int(np.floor(expected))
+
+    default_leak = EC_EFFICIENCY * n * entropy(e / k)
+    assert (secure_key_length(n, k, e) ==
+            secure_key_length(n, k, e, default_leak, eps_sec, eps_cor))
+
+
+def test_secure_key_length_limits():
+    assert secure_key_length(100, 10, 0) == 0                 # too small: clipped at 0
+    assert secure_key_length(10**6, 10**5, 15_000) == 0       # QBER above ~11 %
+    lengths = secure_key_length([10**4, 10**5, 10**6, 10**7], 10**5, 1_000)
+    assert np.all(np.diff(lengths) >= 0)
+
+
+def test_two_basis_key_length():
+    args = dict(leaked=20_000, eps_sec=1e-10, eps_cor=1e-15)
+    # symmetric in swapping the bases
+    assert (two_basis_key_length(800_000, 100_000, 50_000, 20_000, 500, 300, **args) ==
+            two_basis_key_length(100_000, 800_000, 20_000, 50_000, 300, 500, **args))
+    # all key bits in Z: only the X sample bounds their phase errors, at eps_sec / 2
+    n, k_X, e_X = 500_000, 50_000, 500
+    single = n * (1 - entropy(phase_error_bound(n, k_X, e_X, 1e-10 / 2))) - 20_000 \
+        - log2(2 / (1e-10 ** 2 * 1e-15))
+    assert two_basis_key_length(n, 0, 10_000, k_X, 100, e_X, **args) == int(np.floor(single))
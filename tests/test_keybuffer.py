@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from keybuffer import KeyBuffer
+
+
+LENGTHS = [0, 1, 7, 8, 63, 64, 65, 1000]
+
+
+@pytest.mark.parametrize('n', LENGTHS)
+def test_bits_round_trip(n):
+    bits = np.random.default_rng(n).random(n) < 0.5
+    key = KeyBuffer.from_bits(bits)
+    assert len(key) == n
+    assert np.array_equal(key.to_bits(), bits)
+    assert key.tobytes() == np.packbits(bits).tobytes()
+    assert KeyBuffer.from_string(str(key)) == key
+
+
+@pytest.mark.parametrize('n', LENGTHS)
+def test_word_operations_match_bool_arrays(n):
+    rng = np.random.default_rng(n)
+    a, b = rng.random((2, n)) < 0.5
+    A, B = KeyBuffer.from_bits(a), KeyBuffer.from_bits(b)
+    assert np.array_equal((A ^ B).to_bits(), a ^ b)
+    assert np.array_equal((A & B).to_bits(), a & b)
+    assert np.array_equal((A | B).to_bits(), a | b)
+    assert np.array_equal((~A).to_bits(), ~a)
+    assert (~A).weight() == n - a.sum()         # padding stays clear
+    assert A.weight() == a.sum()
+    assert A.parity() == a.sum() % 2
+    assert A.masked_parity(B) == (a & b).sum() % 2
+    assert np.array_equal(A.compress(B).to_bits(), a[b])
+
+
+def test_equality_and_length_check():
+    a = KeyBuffer.from_string('1011')
+    assert a == KeyBuffer.from_string('1011')
+    assert a != KeyBuffer.from_string('1010')
+    assert a != KeyBuffer.from_string('10110')
+    with pytest.raises(ValueError):
+        a ^ KeyBuffer.from_string('10110')
+
+
+def test_indexing():
+    rng = np.random.default_rng(1)
+    bits = rng.random(200) < 0.5
+    key = KeyBuffer.from_bits(bits)
+    idx = rng.permutation(200)[:50]
+    assert np.array_equal(key.get(idx), bits[idx])
+    assert np.array_equal(key.gather(idx).to_bits(), bits[idx])
+    assert key[3] == bits[3] and key[-1] == bits[-1]
+    assert np.array_equal(key[10:30].to_bits(), bits[10:30])
+    with pytest.raises(IndexError):
+        key[200]
+
+    values = rng.random(50) < 0.5
+    key.scatter(idx, values)
+    bits[idx] = values
+    assert np.array_equal(key.to_bits(), bits)
+    key.flip([5, 5, 6])
+    bits[6] = ~bits[6]
+    assert np.array_equal(key.to_bits(), bits)
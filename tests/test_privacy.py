@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+import pytest
+
+from keybuffer import KeyBuffer
+from privacy import (block_output_length, key_blocks, privacy_amplify, stream_privacy_amplify,
+                     toeplitz_hash, toeplitz_seed, write_key_stream)
+
+
+def toeplitz_reference(key: np.ndarray, seed: np.ndarray, m: int) -> np.ndarray:
+    """Explicit T @ key over GF(2) with T[i, j] = seed[i - j + n - 1]."""
+    n = len(key)
+    i, j = np.indices((m, n))
+    T = seed[i - j + n - 1].astype(np.int64)
+    return (T @ key.astype(np.int64)) & 1
+
+
+@pytest.mark.parametrize('n, m', [(1, 1), (17, 5), (64, 64), (300, 120), (1000, 999)])
+def test_toeplitz_hash_matches_matrix_product(n, m):
+    rng = np.random.default_rng(n + m)
+    key = KeyBuffer.from_bits(rng.random(n) < 0.5)
+    seed = toeplitz_seed(n, m, rng)
+    assert len(seed) == n + m - 1
+    expected = toeplitz_reference(key.to_bits(), seed.to_bits(), m)
+    assert np.array_equal(toeplitz_hash(key, seed, m).to_bits(), expected.astype(bool))
+
+
+def test_toeplitz_hash_edge_cases():
+    assert len(toeplitz_hash(KeyBuffer(0), toeplitz_seed(0, 0), 0)) == 0
+    key = KeyBuffer.from_string('1011')
+    with pytest.raises(ValueError):
+        toeplitz_hash(key, KeyBuffer(3), 2)
+    with pytest.raises(ValueError):
+        privacy_amplify(key, 5)
+    final, seed = privacy_amplify(key, 2, np.random.default_rng(0))
+    assert len(final) == 2 and len(seed) == 5
+
+
+def test_stream_matches_blockwise_hash():
+    bits = np.random.default_rng(4).random(10_000) < 0.5
+    key = KeyBuffer.from_bits(bits)
+    ratio = 0.4
+    blocks = list(key_blocks(key, 1024))
+    assert sum(len(b) for b in blocks) == len(key)
+
+    out = list(stream_privacy_amplify(key_blocks(key, 1024), ratio, np.random.default_rng(5)))
+    rng = np.random.default_rng(5)
+    for block, hashed in zip(blocks, out):
+        m = block_output_length(len(block), ratio)
+        assert hashed == toeplitz_hash(block, toeplitz_seed(len(block), m, rng), m)
+
+    buffer = io.BytesIO()
+    assert write_key_stream(out, buffer) == sum(len(b) for b in out)
+    assert buffer.getvalue() == b''.join(b.tobytes() for b in out)
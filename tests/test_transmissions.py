@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from analytic import ANGLES_A, ANGLES_B
+from transmissions import TransmissionTable, bb84_sift_mask, e91_sift_mask
+
+
+def unpack(table, mask):
+    return np.unpackbits(mask, count=table.n).view(bool)
+
+
+@pytest.mark.parametrize('n, block', [(1000, 128), (1000, 100), (997, 13), (5, 8)])
+def test_set_get_any_block_size(n, block):
+    rng = np.random.default_rng(block)
+    settings = rng.integers(0, 3, n).astype(np.uint8)
+    results = rng.random(n) < 0.5
+    table = TransmissionTable.e91(n)
+    starts = rng.permutation(np.arange(0, n, block))       # out of order
+    for start in starts:
+        table.set('A_setting', settings[start:start + block], start)
+        table.set('A_result', results[start:start + block], start)
+    assert np.array_equal(table.get('A_setting'), settings)
+    assert np.array_equal(table.get('A_result'), results)
+    assert np.array_equal(table.get('A_setting', slice(3, 50)), settings[3:50])
+
+
+def test_packed_masks():
+    n = 1001
+    rng = np.random.default_rng(2)
+    cols = {name: rng.random(n) < 0.5 for name in ('A_bit', 'A_basis', 'B_basis', 'B_result')}
+    table = TransmissionTable.bb84(n)
+    for name, values in cols.items():
+        table.set(name, values)
+
+    sift = bb84_sift_mask(table)
+    expected = cols['A_basis'] == cols['B_basis']
+    assert np.array_equal(unpack(table, sift), expected)
+    assert table.count(sift) == expected.sum()
+    assert np.array_equal(unpack(table, table.equals('A_bit', 1)), cols['A_bit'])
+    assert table.count(table.equals('A_bit', 0)) == n - cols['A_bit'].sum()
+    differ = cols['A_bit'] != cols['B_result']
+    assert np.array_equal(unpack(table, table.differ('A_bit', 'B_result')), differ)
+    assert np.array_equal(table.select('A_bit', sift), cols['A_bit'][expected])
+    assert np.array_equal(table.positions(sift), np.flatnonzero(expected))
+    assert np.array_equal(table.positions(sift, 10), np.flatnonzero(expected)[:10])
+
+
+def test_e91_sift_mask():
+    n = 500
+    rng = np.random.default_rng(3)
+    A, B = rng.integers(0, 3, (2, n)).astype(np.uint8)
+    table = TransmissionTable.e91(n)
+    table.set('A_setting', A)
+    table.set('B_setting', B)
+    expected = np.isclose(ANGLES_A[A], ANGLES_B[B])
+    assert np.array_equal(unpack(table, e91_sift_mask(table)), expected)
@@ -0,0 +1,171 @@
+"""
+Columnar, bit-packed transmission table.
+
+Every column is stored as bit planes packed 8 transmissions per byte
+(np.packbits order): booleans (bits, bases, results) take one plane and
+setting indices take as many planes as their range needs. A BB84
+transmission costs 4 bits (6 with Eve) and an E91 pair 6 bits (9 with Eve),
+instead of hundreds of bytes across parallel Python lists.
+
+Masks over transmissions use the same packing, so sifting and mismatch
+counting are byte-wise AND/XOR plus popcount; only the selected values are
+ever unpacked. Blocks can be written at any offset; byte-aligned blocks
+pack straight into the planes.
+"""
+import numpy as np
+
+from analytic import ANGLES_A, ANGLES_B, ANGLES_EVE
+
+
+CHUNK = 1 << 20            # packed bytes unpacked at a time (8M transmissions)
+
+
+def setting_width(k: int) -> int:
+    """Number of bit planes for setting indices in range(k)."""
+    return max(1, (k - 1).bit_length())
+
+
+BB84_COLUMNS = {'A_bit': 1, 'A_basis': 1, 'B_basis': 1, 'B_result': 1}
+BB84_EVE_COLUMNS = {'eve_basis': 1, 'eve_result': 1}
+E91_COLUMNS = {'A_setting': setting_width(len(ANGLES_A)),
+               'B_setting': setting_width(len(ANGLES_B)),
+               'A_result': 1, 'B_result': 1}
+E91_EVE_COLUMNS = {'eve_setting': setting_width(len(ANGLES_EVE)), 'eve_result': 1}
+CHECK_COLUMNS = {'check': 1}       # check bits revealed during transmission
+
+
+class TransmissionTable:
+    """Fixed-length table of n transmissions with bit-packed columns."""
+
+    def __init__(self, n: int, columns: dict):
+        self.n = n
+        self.columns = dict(columns)
+        self.planes = {name: np.zeros((width, (n + 7) // 8), dtype=np.uint8)
+                       for name, width in self.columns.items()}
+
+    @classmethod
+    def bb84(cls, n: int, eve: bool = False, check: bool = False) -> 'TransmissionTable':
+        return cls(n, {**BB84_COLUMNS, **(BB84_EVE_COLUMNS if eve else {}),
+                       **(CHECK_COLUMNS if check else {})})
+
+    @classmethod
+    def e91(cls, n: int, eve: bool = False, check: bool = False) -> 'TransmissionTable':
+        return cls(n, {**E91_COLUMNS, **(E91_EVE_COLUMNS if eve else {}),
+                       **(CHECK_COLUMNS if check else {})})
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def nbytes(self) -> int:
+        return sum(p.nbytes for p in self.planes.values())
+
+    def set(self, name: str, values: np.ndarray, start: int = 0) -> None:
+        """
+        Write a block of values of column 'name' starting at transmission
+        'start'. Bytes shared with neighbouring transmissions (unaligned
+        block edges) keep their other bits.
+        """
+        values = np.asarray(values, dtype=np.uint8)
+        stop = start + len(values)
+        lo, hi = start // 8, (stop + 7) // 8
+        head = start - 8 * lo
+        for k, plane in enumerate(self.planes[name]):
+            bits = (values >> k) & 1
+            if head or stop % 8:
+                merged = np.unpackbits(plane[lo:hi])
+                merged[head:head + len(values)] = bits
+                bits = merged
+            plane[lo:hi] = np.packbits(bits)
+
+    def get(self, name: str, index: slice = slice(None)) -> np.ndarray:
+        """
+        Unpacked values of column 'name' over a contiguous slice of
+        transmissions (bool for one-plane columns, uint8 indices otherwise).
+        """
+        start, stop, _ = index.indices(self.n)
+        stop = max(start, stop)
+        lo, hi = start // 8, (stop + 7) // 8
+        planes = self.planes[name]
+        out = np.zeros(stop - start, dtype=np.uint8)
+        for k, plane in enumerate(planes):
+            out |= np.unpackbits(plane[lo:hi])[start - 8 * lo:stop - 8 * lo] << k
+        return out.view(bool) if len(planes) == 1 else out
+
+    # -----------------------------
+    # packed masks
+    # -----------------------------
+    def trim(self, mask: np.ndarray) -> np.ndarray:
+        """Clear the padding bits past transmission n in a packed mask."""
+        if self.n % 8 and len(mask):
+            mask[-1] &= (0xFF << (8 - self.n % 8)) & 0xFF
+        return mask
+
+    def equals(self, name: str, value: int) -> np.ndarray:
+        """Packed mask of transmissions where column 'name' equals 'value'."""
+        planes = self.planes[name]
+        mask = np.full(planes.shape[1], 0xFF, dtype=np.uint8)
+        for k, plane in enumerate(planes):
+            mask &= plane if value >> k & 1 else ~plane
+        return self.trim(mask)
+
+    def differ(self, name_a: str, name_b: str) -> np.ndarray:
+        """Packed mask of transmissions where two columns differ."""
+        mask = np.zeros((self.n + 7) // 8, dtype=np.uint8)
+        for plane_a, plane_b in zip(self.planes[name_a], self.planes[name_b]):
+            mask |= plane_a ^ plane_b
+        return mask
+
+    def count(self, mask: np.ndarray) -> int:
+        """Number of transmissions selected by a packed mask."""
+        return int(np.bitwise_count(mask).sum(dtype=np.int64))
+
+    def select(self, name: str, mask: np.ndarray) -> np.ndarray:
+        """Values of column 'name' at the transmissions selected by 'mask'."""
+        out = [self.get(name, slice(0, 0))]
+        for lo in range(0, len(mask), CHUNK):
+            values = self.get(name, slice(8 * lo, 8 * (lo + CHUNK)))
+            out.append(values[np.unpackbits(mask[lo:lo + CHUNK], count=len(values)).view(bool)])
+        return np.concatenate(out)
+
+    def positions(self, mask: np.ndarray, limit: int = None) -> np.ndarray:
+        """Indices of (the first 'limit') transmissions selected by 'mask'."""
+        out = [np.zeros(0, dtype=np.int64)]
+        found = 0
+        for lo in range(0, len(mask), CHUNK):
+            idx = 8 * lo + np.flatnonzero(np.unpackbits(mask[lo:lo + CHUNK]))
+            out.append(idx)
+            found += len(idx)
+            if limit is not None and found >= limit:
+                break
+        return np.concatenate(out)[:limit]
+
+
+def bb84_sift_mask(table: TransmissionTable) -> np.ndarray:
+    """Packed mask of BB84 transmissions where A and B used the same basis."""
+    return table.trim(~table.differ('A_basis', 'B_basis'))
+
+
+def bb84_mismatched_counts(table: TransmissionTable):
+    """
+    Discarded-basis statistics: (total, agree) 2x2 arrays indexed
+    [B basis, A basis] (0 = Z, 1 = X), with zeros on the diagonal. 'agree'
+    counts transmissions where B's result equals A's bit.
+    """
+    total = np.zeros((2, 2), dtype=np.int64)
+    agree = np.zeros((2, 2), dtype=np.int64)
+    same = table.trim(~table.differ('A_bit', 'B_result'))
+    for a, b in ((0, 1), (1, 0)):
+        mask = table.equals('A_basis', a) & table.equals('B_basis', b)
+        total[b, a] = table.count(mask)
+        agree[b, a] = table.count(mask & same)
+    return total, agree
+
+
+def e91_sift_mask(table: TransmissionTable, angles_A: np.ndarray = ANGLES_A,
+                  angles_B: np.ndarray = ANGLES_B) -> np.ndarray:
+    """Packed mask of E91 pairs where A and B measured along the same angle."""
+    mask = np.zeros((table.n + 7) // 8, dtype=np.uint8)
+    for i, j in zip(*np.nonzero(np.isclose(angles_A[:, None], angles_B[None, :]))):
+        mask |= table.equals('A_setting', i) & table.equals('B_setting', j)
+    return mask
@@ -0,0 +1,232 @@
+"""
+Statistical equivalence harness for the simulation backends.
+
+Runs every backend on the same configurations (Eve off, Eve two-stage, Eve
+fused) and compares it with a reference backend:
+
+- per-setting outcome frequencies over a balanced design covering every
+  BB84 (bit, basis, basis[, Eve basis]) and E91 (angle, angle[, Eve angle])
+  combination: chi-square test of homogeneity, summed over settings;
+- per-session QBER and E91 correlations E(a_i, b_j): two-sample KS tests.
+
+All p-values are Bonferroni-corrected over the whole run. The report also
+gives the per-setting sample size needed to detect a given deviation at the
+chosen confidence.
+
+    python validation.py --backends numpy aer_batched cached --n 2000
+"""
+import argparse
+import itertools
+import sys
+from typing import NamedTuple
+
+import numpy as np
+from scipy import stats
+
+from analytic import ANGLES_A, ANGLES_B, ANGLES_EVE
+from backends import BACKENDS, get_backend
+
+
+CONFIGS = {
+    'no_eve':    dict(eve=False, fused_eve=False),
+    'eve':       dict(eve=True, fused_eve=False),
+    'eve_fused': dict(eve=True, fused_eve=True),
+}
+
+
+class CheckResult(NamedTuple):
+    backend: str
+    protocol: str
+    config: str
+    metric: str
+    test: str
+    statistic: float
+    p_value: float
+
+
+# -----------------------------
+# Per-setting outcome frequencies
+# -----------------------------
+def bb84_counts(backend, n_per_setting: int, eve: bool) -> np.ndarray:
+    """
+    Outcome counts for every (bit, A basis, B basis[, Eve basis]) setting.
+    Returns shape (settings, 4) indexed by outcome B + 2*Eve.
+    """
+    combos = np.array(list(itertools.product([0, 1], repeat=4 if eve else 3)))
+    rows = np.repeat(combos, n_per_setting, axis=0).astype(bool)
+    settings = np.repeat(np.arange(len(combos)), n_per_setting)
+    B, E = backend.bb84_block(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3] if eve else None)
+    outcome = B.astype(np.int64) + 2 * (0 if E is None else E.astype(np.int64))
+    return np.bincount(settings * 4 + outcome, minlength=len(combos) * 4).reshape(-1, 4)
+
+
+def e91_counts(backend, n_per_setting: int, eve: bool) -> np.ndarray:
+    """
+    Outcome counts for every (A angle, B angle[, Eve angle]) setting.
+    Returns shape (settings, 8) indexed by outcome a + 2*b + 4*e.
+    """
+    sizes = [len(ANGLES_A), len(ANGLES_B)] + ([len(ANGLES_EVE)] if eve else [])
+    combos = np.array(list(itertools.product(*map(range, sizes))))
+    rows = np.repeat(combos, n_per_setting, axis=0)
+    settings = np.repeat(np.arange(len(combos)), n_per_setting)
+    a, b, e = backend.e91_block(rows[:, 0], rows[:, 1], rows[:, 2] if eve else None)
+    outcome = a.astype(np.int64) + 2 * b + 4 * (0 if e is None else e.astype(np.int64))
+    return np.bincount(settings * 8 + outcome, minlength=len(combos) * 8).reshape(-1, 8)
+
+
+def homogeneity_test(ref: np.ndarray, other: np.ndarray) -> tuple[float, float]:
+    """
+    Chi-square test that two (settings, outcomes) count tables come from the
+    same per-setting distributions. Per-setting statistics and degrees of
+    freedom are summed. Returns (statistic, p_value).
+    """
+    statistic, dof = 0.0, 0
+    for r, o in zip(ref, other):
+        keep = (r + o) > 0
+        if keep.sum() < 2:
+            continue        # deterministic outcome in both: nothing to test
+        table = np.vstack([r[keep], o[keep]])
+        chi2, _, d, _ = stats.chi2_contingency(table, correction=False)
+        statistic += chi2
+        dof += d
+    if dof == 0:
+        return 0.0, 1.0
+    return statistic, float(stats.chi2.sf(statistic, dof))
+
+
+# -----------------------------
+# Per-session QBER and correlations
+# -----------------------------
+def bb84_sessions(backend, sessions: int, m: int, eve: bool,
+                  rng: np.random.Generator) -> dict:
+    """Sifted QBER of 'sessions' random sessions of m qubits each."""
+    qber = np.empty(sessions)
+    for k in range(sessions):
+        A_bits, A_bases, B_bases, eve_bases = rng.integers(0, 2, (4, m)).astype(bool)
+        B, _ = backend.bb84_block(A_bits, A_bases, B_bases, eve_bases if eve else None)
+        sift = A_bases == B_bases
+        qber[k] = np.mean(A_bits[sift] != B[sift])
+    return {'qber': qber}
+
+
+def e91_sessions(backend, sessions: int, m: int, eve: bool,
+                 rng: np.random.Generator) -> dict:
+    """Per-session key QBER and E(a_i, b_j) for every angle pair."""
+    metrics = {'qber': np.empty(sessions)}
+    for i, j in itertools.product(range(len(ANGLES_A)), range(len(ANGLES_B))):
+        metrics[f'E(a{i + 1},b{j + 1})'] = np.empty(sessions)
+    for k in range(sessions):
+        A = rng.integers(0, len(ANGLES_A), m)
+        B = rng.integers(0, len(ANGLES_B), m)
+        E = rng.integers(0, len(ANGLES_EVE), m) if eve else None
+        a, b, _ = backend.e91_block(A, B, E)
+        key = np.isclose(ANGLES_A[A], ANGLES_B[B])
+        metrics['qber'][k] = np.mean(a[key] != b[key])
+        sign = np.where(a == b, 1.0, -1.0)
+        flat = A * len(ANGLES_B) + B
+        sums = np.bincount(flat, sign, minlength=len(ANGLES_A) * len(ANGLES_B))
+        counts = np.bincount(flat, minlength=len(ANGLES_A) * len(ANGLES_B))
+        corr = sums / np.maximum(counts, 1)
+        for idx, (i, j) in enumerate(itertools.product(range(len(ANGLES_A)), range(len(ANGLES_B)))):
+            metrics[f'E(a{i + 1},b{j + 1})'][k] = corr[idx]
+    return metrics
+
+
+def ks_tests(ref: dict, other: dict) -> list[tuple[str, float, float]]:
+    """Two-sample KS test for every metric. Returns [(metric, statistic, p_value)]."""
+    out = []
+    for metric, values in ref.items():
+        if np.ptp(values) == 0 and np.ptp(other[metric]) == 0 and values[0] == other[metric][0]:
+            out.append((metric, 0.0, 1.0))    # identical constants (e.g. QBER 0)
+            continue
+        result = stats.ks_2samp(values, other[metric])
+        out.append((metric, float(result.statistic), float(result.pvalue)))
+    return out
+
+
+# -----------------------------
+# Sample size
+# -----------------------------
+def required_sample_size(p: float, delta: float, confidence: float = 0.99,
+                         power: float = 0.9) -> int:
+    """
+    Samples per backend needed for a two-sided two-proportion test at the
+    given confidence to detect a shift 'delta' from rate p with 'power'.
+    """
+    z_alpha = stats.norm.ppf(1 - (1 - confidence) / 2)
+    z_beta = stats.norm.ppf(power)
+    variance = p * (1 - p) + (p + delta) * (1 - p - delta)
+    return int(np.ceil((z_alpha + z_beta) ** 2 * variance / delta ** 2))
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+def validate(backend_names: list, reference: str = 'numpy', n_per_setting: int = 2000,
+             sessions: int = 30, session_size: int = 400, seed: int = 0) -> list[CheckResult]:
+    """Compare every backend with the reference on every configuration."""
+    results = []
+    for config, opts in CONFIGS.items():
+        ref = get_backend(reference, seed=seed, fused_eve=opts['fused_eve'])
+        ref_data = {
+            'bb84': (bb84_counts(ref, n_per_setting, opts['eve']),
+                     bb84_sessions(ref, sessions, session_size, opts['eve'],
+                                   np.random.default_rng(seed))),
+            'e91': (e91_counts(ref, n_per_setting, opts['eve']),
+                    e91_sessions(ref, sessions, session_size, opts['eve'],
+                                 np.random.default_rng(seed))),
+        }
+        for name in backend_names:
+            if name == reference:
+                continue
+            backend = get_backend(name, seed=seed + 1, fused_eve=opts['fused_eve'])
+            for protocol, counts_fn, sessions_fn in (('bb84', bb84_counts, bb84_sessions),
+                                                     ('e91', e91_counts, e91_sessions)):
+                ref_counts, ref_sessions = ref_data[protocol]
+                stat, p = homogeneity_test(ref_counts, counts_fn(backend, n_per_setting, opts['eve']))
+                results.append(CheckResult(name, protocol, config, 'outcomes', 'chi2', stat, p))
+                other = sessions_fn(backend, sessions, session_size, opts['eve'],
+                                    np.random.default_rng(seed + 1))
+                for metric, stat, p in ks_tests(ref_sessions, other):
+                    results.append(CheckResult(name, protocol, config, metric, 'ks', stat, p))
+            backend.close()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--backends', nargs='+',
+                        default=[b for b in BACKENDS if b != 'aer_per_shot'])
+    parser.add_argument('--reference', default='numpy')
+    parser.add_argument('--n', type=int, default=2000, help="transmissions per setting")
+    parser.add_argument('--sessions', type=int, default=30)
+    parser.add_argument('--session-size', type=int, default=400)
+    parser.add_argument('--alpha', type=float, default=0.01, help="family-wise error rate")
+    parser.add_argument('--delta', type=float, default=0.01,
+                        help="deviation to size the sample for")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    results = validate(args.backends, args.reference, args.n, args.sessions,
+                       args.session_size, args.seed)
+    threshold = args.alpha / max(1, len(results))        # Bonferroni
+    failures = 0
+    print(f"{'backend':18} {'protocol':8} {'config':10} {'metric':12} {'test':5} "
+          f"{'stat':>10} {'p':>10}")
+    for r in results:
+        ok = r.p_value >= threshold
+        failures += not ok
+        print(f"{r.backend:18} {r.protocol:8} {r.config:10} {r.metric:12} {r.test:5} "
+              f"{r.statistic:10.4f} {r.p_value:10.3g} {'' if ok else 'FAIL'}")
+
+    print(f"\n{len(results)} tests, Bonferroni threshold p < {threshold:.2g}: {failures} failed")
+    print(f"Samples per setting to detect a {args.delta:.3f} shift at "
+          f"{(1 - args.alpha) * 100:.1f}% confidence (90% power):")
+    for label, p in (('p = 0.5 (coin outcomes)', 0.5), ('p = 0.25 (QBER under Eve)', 0.25),
+                     ('p = 0.11 (QBER threshold)', 0.11)):
+        print(f"  {label:28}: {required_sample_size(p, args.delta, 1 - args.alpha)}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())